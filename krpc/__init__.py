@@ -1,5 +1,45 @@
-from .core import Entrypoint
-from .errors import RpcException, RpcErrorCode
-from .models import RpcRequestModel, RpcResponseModel
-from .message import Message, JsonMessage, MsgpackMessage, message_management
-from .client import RpcClient, DictConfig
+import importlib
+from typing import TYPE_CHECKING, Any
+
+# 按需导入：`from krpc import RpcClient` 不会加载 FastAPI、Starlette 和 msgpack，
+# 服务端相关模块在首次访问 `Entrypoint` 等名称时才导入
+_exports = {
+    'Entrypoint': '.core',
+    'RpcException': '.errors',
+    'RpcErrorCode': '.errors',
+    'RpcRequestModel': '.models',
+    'RpcResponseModel': '.models',
+    'Message': '.message',
+    'JsonMessage': '.message',
+    'MsgpackMessage': '.message',
+    'message_management': '.message',
+    'RpcClient': '.client',
+    'DictConfig': '.client',
+    'LazyResponse': '.client',
+    'ColumnarRows': '.columnar',
+    'TrafficRecorder': '.capture',
+}
+
+__all__ = list(_exports)
+
+if TYPE_CHECKING:
+    from .core import Entrypoint
+    from .errors import RpcException, RpcErrorCode
+    from .models import RpcRequestModel, RpcResponseModel
+    from .message import Message, JsonMessage, MsgpackMessage, message_management
+    from .client import RpcClient, DictConfig, LazyResponse
+    from .columnar import ColumnarRows
+    from .capture import TrafficRecorder
+
+
+def __getattr__(name: str) -> Any:
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(list(globals()) + __all__)
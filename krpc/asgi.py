@@ -0,0 +1,149 @@
+import asyncio
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.requests import Request
+
+from .capture import SERVER_TIME_HEADER, TIMING_HEADER
+from .message import SUBSCRIBE_PATH
+from .subscription import stream_events
+
+if TYPE_CHECKING:
+    from .core import Entrypoint
+    from .message import Message
+
+
+# ASGI 的请求头名为小写字节串
+_TIMING_HEADER = TIMING_HEADER.lower().encode('latin-1')
+_SERVER_TIME_HEADER = SERVER_TIME_HEADER.lower().encode('latin-1')
+
+
+def _replay_body(body: bytes, receive: Callable) -> Callable:
+    """
+    返回先重放已读取的请求体、之后转交原 `receive` 的 receive，
+    使注入的 `Request` 能像 FastAPI 路由中一样读取 `body()`/`json()`。
+    """
+    replayed = False
+
+    async def replay() -> Dict[str, Any]:
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        return await receive()
+
+    return replay
+
+
+class RpcASGIApp:
+    """
+    纯 ASGI 的 RPC 入口，不经过 FastAPI 路由匹配和 Starlette `Response`。
+
+    读取请求体后直接交给对应编码器的 `Message.handle` 分发，再把编码后的字节写入 `send`。
+    方法表、编码器和依赖资源与所属的 `Entrypoint` 共享，所有 POST 请求都视为 RPC 调用，
+    访问路径由部署方式（独立运行或 `app.mount`）决定；路径以 `/_subscribe` 结尾的请求视为订阅。
+    """
+
+    def __init__(self, entrypoint: 'Entrypoint'):
+        self.entrypoint = entrypoint
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope['type'] == 'http':
+            await self.handle_http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self.handle_lifespan(receive, send)
+
+    async def handle_http(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope['method'] != 'POST':
+            await self.send_bytes(send, 405, b'Method Not Allowed', b'text/plain')
+            return
+
+        chunks = []
+        more_body = True
+        while more_body:
+            event = await receive()
+            if event['type'] == 'http.disconnect':
+                return
+            chunks.append(event.get('body', b''))
+            more_body = event.get('more_body', False)
+        body = chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+        rpc_media_type = ''
+        timing = False
+        for name, value in scope['headers']:
+            if name == b'x-krpc-type':
+                rpc_media_type = value.decode('latin-1').lower()
+            elif name == _TIMING_HEADER:
+                timing = True
+        message = self.entrypoint.get_message_by_type(rpc_media_type)
+        if scope['path'].endswith(SUBSCRIBE_PATH) and self.entrypoint.rpc_subscriptions:
+            await self.handle_subscribe(scope, receive, send, message, body)
+            return
+        content, seconds = await self.entrypoint.dispatch(message, body, Request(scope, _replay_body(body, receive)))
+        headers = [(_SERVER_TIME_HEADER, repr(seconds).encode('latin-1'))] if timing else None
+        await self.send_bytes(send, 200, content, (message.rpc_media_type or '').encode('latin-1'), headers)
+
+    async def handle_subscribe(self, scope: Dict[str, Any], receive: Callable, send: Callable,
+                               message: 'Message', body: bytes) -> None:
+        entrypoint = self.entrypoint
+        events = stream_events(
+            message, body, entrypoint.rpc_subscriptions, entrypoint.broadcaster, entrypoint.resources,
+            Request(scope, _replay_body(body, receive))
+        )
+
+        async def stream() -> None:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [(b'content-type', (message.rpc_media_type or '').encode('latin-1'))],
+            })
+            async for frame in events:
+                await send({'type': 'http.response.body', 'body': frame, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        async def wait_disconnect() -> None:
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        # 客户端断开时取消推送，`stream_events` 随之注销订阅者
+        streaming = asyncio.create_task(stream())
+        disconnect = asyncio.create_task(wait_disconnect())
+        try:
+            await asyncio.wait({streaming, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            disconnect.cancel()
+            streaming.cancel()
+            results = await asyncio.gather(streaming, disconnect, return_exceptions=True)
+            await events.aclose()
+        if isinstance(results[0], Exception):
+            raise results[0]
+
+    async def handle_lifespan(self, receive: Callable, send: Callable) -> None:
+        resources = self.entrypoint.resources
+        while True:
+            event = await receive()
+            if event['type'] == 'lifespan.startup':
+                try:
+                    await resources.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif event['type'] == 'lifespan.shutdown':
+                await resources.shutdown()
+                self.entrypoint.stop_capture()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def send_bytes(send: Callable, status: int, content: bytes, content_type: bytes,
+                         headers: Optional[List[Tuple[bytes, bytes]]] = None) -> None:
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-length', str(len(content)).encode('latin-1')),
+                (b'content-type', content_type),
+                *(headers or ()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': content})
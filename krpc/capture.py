@@ -0,0 +1,129 @@
+import os
+import queue
+import random
+import threading
+from typing import Any, BinaryIO, Dict, Iterator, Optional
+
+from .message import encode_frame
+
+# 请求头：要求服务端在响应头 `X-Krpc-Server-Time` 中返回处理耗时（秒），用于回放时比较服务端耗时
+TIMING_HEADER = 'X-Krpc-Timing'
+SERVER_TIME_HEADER = 'X-Krpc-Server-Time'
+
+_STOP = object()
+
+
+def _import_msgpack():
+    try:
+        import msgpack
+    except ImportError as e:
+        raise ImportError("krpc traffic capture requires 'msgpack', install it with `pip install msgpack`") from e
+    return msgpack
+
+
+class TrafficRecorder:
+    """
+    按比例采样 RPC 请求并写入本地日志，用于离线回放（见 `krpc.replay`）。
+
+    每条记录是一个 msgpack 字典，以 4 字节大端长度前缀分帧：
+    `{'time': 收到请求的时间戳, 'path': 入口路径, 'type': 编码类型, 'headers': X-Krpc-* 请求头, 'body': 原始请求体, 'seconds': 处理耗时}`。
+    多 worker 运行时每个进程应写入不同的文件，路径中的 `{pid}` 会被替换为进程号。
+    """
+
+    def __init__(self, path: str, sample_rate: float = 1.0, max_bytes: Optional[int] = None,
+                 queue_size: int = 10000):
+        """
+        :param path: 日志文件路径，已存在时追加写入。
+        :param sample_rate: 采样比例，0 到 1 之间。
+        :param max_bytes: （可选）日志文件的最大字节数，达到后停止记录。
+        :param queue_size: 等待写入的记录数上限，写入跟不上时丢弃新记录（计入 `dropped`）。
+        """
+        self.path = path.format(pid=os.getpid())
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.records = 0
+        self.dropped = 0
+        self._msgpack = _import_msgpack()
+        self._file: BinaryIO = open(self.path, 'ab')
+        self._size = self._file.tell()
+        self._closed = False
+        # 编码和写文件在后台线程中进行，请求处理时只把记录放入队列
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._writer = threading.Thread(target=self._write_loop, name='krpc-capture', daemon=True)
+        self._writer.start()
+
+    def sample(self) -> bool:
+        if self._closed:
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def record(self, rpc_path: str, rpc_media_type: Optional[str], headers: Dict[str, str], body: bytes,
+               started: float, seconds: float) -> None:
+        if self._closed:
+            return
+        try:
+            self._queue.put_nowait({
+                'time': started,
+                'path': rpc_path,
+                'type': rpc_media_type,
+                'headers': headers,
+                'body': body,
+                'seconds': seconds,
+            })
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self) -> None:
+        while True:
+            record = self._queue.get()
+            # 取出当前已排队的全部记录后批量写入
+            batch = [record]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is _STOP:
+                    self._file.close()
+                    return
+                self._write(record)
+            if not self._file.closed:
+                self._file.flush()
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        if self._file.closed:
+            return
+        frame = encode_frame(self._msgpack.packb(record))
+        if self.max_bytes is not None and self._size + len(frame) > self.max_bytes:
+            self._closed = True
+            self._file.close()
+            return
+        self._file.write(frame)
+        self._size += len(frame)
+        self.records += 1
+
+    def close(self) -> None:
+        """停止记录，等待已排队的记录写入完成后关闭文件。"""
+        if self._writer.is_alive():
+            self._closed = True
+            self._queue.put(_STOP)
+            self._writer.join()
+
+
+def read_capture(path: str) -> Iterator[Dict[str, Any]]:
+    """逐条读取 `TrafficRecorder` 写入的日志，文件末尾不完整的记录会被忽略。"""
+    msgpack = _import_msgpack()
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(4)
+            if len(header) < 4:
+                return
+            size = int.from_bytes(header, 'big')
+            payload = f.read(size)
+            if len(payload) < size:
+                return
+            try:
+                yield msgpack.unpackb(payload)
+            except ValueError:
+                return
@@ -0,0 +1,94 @@
+import argparse
+import logging
+import sys
+from typing import Optional, Sequence
+
+
+def add_serve_parser(subparsers) -> None:
+    parser = subparsers.add_parser('serve', help='以多 worker 方式运行 krpc 服务')
+    parser.add_argument('app', help='`module:attribute` 形式的 ASGI 应用路径')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址，默认 127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000, help='监听端口，默认 8000')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='worker 数量，默认为可用 CPU 数量')
+    parser.add_argument('--pin-cpus', action='store_true', help='将每个 worker 绑定到一个 CPU 核心')
+    parser.add_argument('--stats-interval', type=float, default=5.0, help='worker 上报调用统计的间隔（秒）')
+    parser.add_argument('--stats-file', default=None, help='定期写入合并后调用统计的 JSON 文件')
+    parser.add_argument('--log-level', default='info', help='日志级别，默认 info')
+    parser.set_defaults(handler=serve)
+
+
+def serve(args: argparse.Namespace) -> int:
+    from .server import serve as run_serve
+
+    run_serve(
+        args.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        pin_cpus=args.pin_cpus,
+        stats_interval=args.stats_interval,
+        stats_file=args.stats_file,
+        log_level=args.log_level,
+    )
+    return 0
+
+
+def add_replay_parser(subparsers) -> None:
+    parser = subparsers.add_parser('replay', help='回放 `Entrypoint.capture` 采集的请求并比较各方法的耗时')
+    parser.add_argument('capture', help='采集日志文件路径')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--app', help='`module:attribute` 形式的 ASGI 应用路径，在进程内通过 ASGITransport 回放')
+    target.add_argument('--url', help='RPC 入口的完整 URL，通过网络回放')
+    parser.add_argument('--path', default=None, help='进程内回放时的入口路径，默认使用采集时记录的路径')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放速度倍数，0 表示不保留请求间隔逐个发送，默认 1')
+    parser.add_argument('--json', default=None, help='将报告写入 JSON 文件')
+    parser.add_argument('--log-level', default='warning', help='日志级别，默认 warning')
+    parser.set_defaults(handler=replay)
+
+
+def replay(args: argparse.Namespace) -> int:
+    import asyncio
+    import json
+
+    import httpx
+
+    from .client import RpcClient
+    from .replay import format_report, load_app, load_capture, replay as run_replay
+
+    records = load_capture(args.capture)
+    if not records:
+        print(f"no requests found in {args.capture}")
+        return 1
+    if args.app:
+        path = args.path or records[0].get('path') or '/'
+        client = RpcClient('http://krpc' + path, transport=httpx.ASGITransport(app=load_app(args.app)))
+    else:
+        client = RpcClient(args.url)
+
+    async def run() -> dict:
+        try:
+            return await run_replay(records, client, speed=args.speed)
+        finally:
+            # 进程内回放使用的 ASGITransport 只支持异步客户端
+            await client.client_async.aclose()
+
+    report = asyncio.run(run())
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='krpc', description='krpc 命令行工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    add_serve_parser(subparsers)
+    add_replay_parser(subparsers)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=getattr(args, 'log_level', 'info').upper(), format='%(levelname)s: %(message)s')
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,14 @@
+import json
 import uuid
-from typing import Any, Dict, Optional, Union, Awaitable
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple, Union, Awaitable
 import httpx
 from httpx import BaseTransport
 from pydantic import BaseModel
-from .message import Message, JsonMessage, message_management
+from .columnar import COLUMNAR, COLUMNAR_HEADER, ColumnarRows, is_columnar
+from .message import IF_NONE_MATCH_HEADER, SUBSCRIBE_PATH, FrameDecoder, Message, JsonMessage, message_management
+from .shm import AsyncSharedMemoryTransport, SharedMemoryTransport, response_content
 
 
 class DictConfig(BaseModel):
@@ -15,6 +20,60 @@ class DictConfig(BaseModel):
     exclude_none: bool = False
 
 
+class LazyResponse(Mapping):
+    """
+    按需解码的RPC响应。信封（id、error）在构造时解码，`result` 在首次访问时才解码，
+    编码器支持时（如 msgpack）其内部的嵌套结构也只在访问时解码。
+    """
+
+    def __init__(self, message: Message, content: bytes) -> None:
+        self._message = message
+        if message.lazy_result:
+            self._envelope, self._raw_result = message.split_response(content)
+            self._result: Any = None
+            self._decoded = self._raw_result is None
+        else:
+            # 编码器无法跳过 result 时直接完整解码，避免解码-编码-再解码
+            self._envelope = message.decode(content)
+            self._result = self._envelope.pop('result', None)
+            self._raw_result = None
+            self._decoded = True
+
+    @property
+    def raw_result(self) -> bytes | None:
+        """`result` 未解码的原始字节，可直接转发。"""
+        if self._raw_result is None:
+            self._raw_result = self._message.encode(self._result)
+        return self._raw_result
+
+    @property
+    def result(self) -> Any:
+        if not self._decoded:
+            self._result = self._message.decode_lazy(self._raw_result)
+            self._decoded = True
+        if is_columnar(self._result):
+            self._result = ColumnarRows.from_result(self._result)
+        return self._result
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'result':
+            return self.result
+        return self._envelope[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key == 'result' or key in self._envelope
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._envelope
+        yield 'result'
+
+    def __len__(self) -> int:
+        return len(self._envelope) + 1
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+
 class RpcClient:
     def __init__(
             self,
@@ -22,6 +81,8 @@ class RpcClient:
             rpc_media_type: str = 'json',
             cust_messages: Optional[Dict[str, Message]] = None,
             transport: BaseTransport | Any | None = None,
+            uds: Optional[str] = None,
+            etag_cache_size: int = 256,
     ) -> None:
         """
         RPC客户端初始化。
@@ -30,33 +91,110 @@ class RpcClient:
         :param rpc_media_type: 消息编码类型，默认为 'json'。
         :param cust_messages: 自定义消息处理器字典。
         :param transport: （可选）用于通过网络发送请求的传输类。
+        :param uds: （可选）Unix 域套接字路径，用于调用同一主机上通过 `krpc.server.run_unix` 运行的服务，
+                    此时 `url` 仅用于提供 Host 和路径。与 `transport` 同时指定时以 `transport` 为准。
+                    服务端启用共享内存时（见 `run_unix` 的 `shm_threshold`），较大的响应体通过内存映射段传递，
+                    直接从映射内存解码。
+        :param etag_cache_size: 按 ETag 缓存的结果数量，为 0 时不缓存。对声明了 `etag` 的方法，
+                                客户端会携带缓存的 ETag，服务端返回 `not_modified` 时直接使用缓存的结果。
         """
         self.url = url
         self.rpc_media_type = rpc_media_type
         self.messages = cust_messages or message_management
-        self.client_sync = httpx.Client(transport=transport)
-        self.client_async = httpx.AsyncClient(transport=transport)
+        sync_transport = async_transport = transport
+        if transport is None and uds is not None:
+            sync_transport = SharedMemoryTransport(uds=uds)
+            async_transport = AsyncSharedMemoryTransport(uds=uds)
+        self.client_sync = httpx.Client(transport=sync_transport)
+        self.client_async = httpx.AsyncClient(transport=async_transport)
+        self.etag_cache_size = etag_cache_size
+        # (编码类型, 方法, 是否列式, 参数) -> (etag, 已解码的结果)
+        self._etag_cache: OrderedDict[Tuple, Tuple[str, Any]] = OrderedDict()
+        # 返回过 ETag 的方法，只有这些方法才需要计算缓存键
+        self._etag_methods: set[str] = set()
 
     def close(self) -> None:
+        """关闭同步客户端的连接，异步客户端请使用 `aclose`。"""
+        self.client_sync.close()
+
+    async def aclose(self) -> None:
         """关闭同步和异步客户端的连接。"""
         self.client_sync.close()
-        self.client_async.aclose()
+        await self.client_async.aclose()
 
     def _get_message(self) -> Message:
         """根据媒体类型获取消息编码器。"""
         return self.messages.get(self.rpc_media_type) or JsonMessage()
 
-    def _prepare_request_data(
+    def _decode_response(self, content: bytes, lazy: bool = False, raw: bool = False) -> Any:
+        """根据调用选项解码响应内容。"""
+        message = self._get_message()
+        if raw:
+            envelope, raw_result = message.split_response(content)
+            envelope['result'] = raw_result
+            return envelope
+        if lazy:
+            return LazyResponse(message, content)
+        data = message.decode(content)
+        if is_columnar(data.get('result')):
+            data['result'] = ColumnarRows.from_result(data['result'])
+        return data
+
+    def _etag_key(self, method: str, params: Dict[str, Any], columnar: bool) -> Tuple:
+        return self.rpc_media_type, method, columnar, json.dumps(params, sort_keys=True, default=str)
+
+    def _conditional_headers(
+            self,
+            method: str,
+            params: Dict[str, Any],
+            headers: Optional[Dict[str, str]],
+            columnar: bool
+    ) -> Tuple[Optional[Dict[str, str]], Optional[Tuple[str, Any]]]:
+        """为返回过 ETag 的方法附加缓存的 ETag，并返回本次请求所依据的缓存项。"""
+        if not self.etag_cache_size or method not in self._etag_methods:
+            return headers, None
+        cached = self._etag_cache.get(self._etag_key(method, params, columnar))
+        if cached is None:
+            return headers, None
+        return {**(headers or {}), IF_NONE_MATCH_HEADER: cached[0]}, cached
+
+    def _apply_etag(
             self,
             method: str,
+            params: Dict[str, Any],
+            columnar: bool,
+            data: Any,
+            cached: Optional[Tuple[str, Any]]
+    ) -> Any:
+        """缓存带 ETag 的结果；收到 `not_modified` 时使用缓存的结果（多次调用间共享，请勿修改）。"""
+        if not self.etag_cache_size or not isinstance(data, dict) or 'etag' not in data:
+            return data
+        self._etag_methods.add(method)
+        key = self._etag_key(method, params, columnar)
+        if data.get('not_modified') and cached is not None and cached[0] == data['etag']:
+            data['result'] = cached[1]
+        else:
+            self._etag_cache[key] = (data['etag'], data.get('result'))
+        self._etag_cache.move_to_end(key)
+        while len(self._etag_cache) > self.etag_cache_size:
+            self._etag_cache.popitem(last=False)
+        return data
+
+    @staticmethod
+    def _columnar_headers(headers: Optional[Dict[str, str]], columnar: bool) -> Optional[Dict[str, str]]:
+        if not columnar:
+            return headers
+        return {**(headers or {}), COLUMNAR_HEADER: COLUMNAR}
+
+    @staticmethod
+    def _dump_params(
             params: Optional[Union[dict, BaseModel]] = None,
             dict_config: Optional[DictConfig] = None
     ) -> Dict[str, Any]:
-        """准备请求的数据包，并处理 BaseModel 参数。"""
-        if dict_config is None:
-            dict_config = DictConfig()
-
+        """将参数转换为字典，并处理 BaseModel 参数。"""
         if isinstance(params, BaseModel):
+            if dict_config is None:
+                dict_config = DictConfig()
             params = params.model_dump(
                 include=dict_config.include,
                 exclude=dict_config.exclude,
@@ -65,10 +203,18 @@ class RpcClient:
                 exclude_defaults=dict_config.exclude_defaults,
                 exclude_none=dict_config.exclude_none
             )
+        return params or {}
 
+    def _prepare_request_data(
+            self,
+            method: str,
+            params: Optional[Union[dict, BaseModel]] = None,
+            dict_config: Optional[DictConfig] = None
+    ) -> Dict[str, Any]:
+        """准备请求的数据包，并处理 BaseModel 参数。"""
         request_data = {
             "method": method,
-            "params": params or {},
+            "params": self._dump_params(params, dict_config),
             "id": str(uuid.uuid4())
         }
         message = self._get_message()
@@ -89,31 +235,36 @@ class RpcClient:
         request_kwargs = self._prepare_request_data(method, params, dict_config)
         if headers:
             request_kwargs['headers'].update(headers)
-        if isinstance(client, httpx.Client):
-            return client.post(**request_kwargs)
-        else:
-            async def send():
-                async with client as client_async:
-                    return await client_async.post(**request_kwargs)
-
-            return send()
+        return client.post(**request_kwargs)
 
     def call(
             self,
             method: str,
             params: Optional[Union[dict, BaseModel]] = None,
             headers: Optional[dict[str, str]] = None,
-            dict_config: Optional[DictConfig] = None
+            dict_config: Optional[DictConfig] = None,
+            lazy: bool = False,
+            raw: bool = False,
+            columnar: bool = False
     ) -> Any:
         """
         同步调用RPC方法。
+
+        :param lazy: 为 True 时返回 `LazyResponse`，`result` 在访问时才解码。
+        :param raw: 为 True 时 `result` 为未解码的编码字节，适用于直接转发的代理。
+        :param columnar: 为 True 时请求以列式编码返回记录列表，`result` 为 `ColumnarRows`。
         """
         try:
-            response = self._send_request_base(
-                self.client_sync, method, params, headers, dict_config
-            )
-            message = self._get_message()
-            data = message.decode(response.content)
+            params = self._dump_params(params, dict_config)
+            headers = self._columnar_headers(headers, columnar)
+            conditional = not lazy and not raw
+            cached = None
+            if conditional:
+                headers, cached = self._conditional_headers(method, params, headers, columnar)
+            response = self._send_request_base(self.client_sync, method, params, headers)
+            data = self._decode_response(response_content(response), lazy, raw)
+            if conditional:
+                data = self._apply_etag(method, params, columnar, data, cached)
         except Exception as e:
             data = {'error': str(e)}
         return data
@@ -123,24 +274,69 @@ class RpcClient:
             method: str,
             params: Optional[Union[dict, BaseModel]] = None,
             headers: Optional[Dict[str, str]] = None,
-            dict_config: Optional[DictConfig] = None
+            dict_config: Optional[DictConfig] = None,
+            lazy: bool = False,
+            raw: bool = False,
+            columnar: bool = False
     ) -> Any:
         """
         异步调用RPC方法。
+
+        :param lazy: 为 True 时返回 `LazyResponse`，`result` 在访问时才解码。
+        :param raw: 为 True 时 `result` 为未解码的编码字节，适用于直接转发的代理。
+        :param columnar: 为 True 时请求以列式编码返回记录列表，`result` 为 `ColumnarRows`。
         """
         try:
-            response = await self._send_request_base(self.client_async, method, params, headers, dict_config)
-            message = self._get_message()
-            data = message.decode(response.content)
+            params = self._dump_params(params, dict_config)
+            headers = self._columnar_headers(headers, columnar)
+            conditional = not lazy and not raw
+            cached = None
+            if conditional:
+                headers, cached = self._conditional_headers(method, params, headers, columnar)
+            response = await self._send_request_base(self.client_async, method, params, headers)
+            data = self._decode_response(response_content(response), lazy, raw)
+            if conditional:
+                data = self._apply_etag(method, params, columnar, data, cached)
         except Exception as e:
             data = {'error': str(e)}
         return data
 
+    async def subscribe_async(
+            self,
+            method: str,
+            params: Optional[Union[dict, BaseModel]] = None,
+            headers: Optional[Dict[str, str]] = None,
+            dict_config: Optional[DictConfig] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        订阅通过 `Entrypoint.subscribe` 注册的方法，返回异步迭代器，每个元素为 `{'result': ..., 'error': ...}`。
+        服务端结束推送或返回错误后迭代结束，提前退出迭代会关闭连接并取消订阅。
+
+        Usage:
+
+            async for event in client.subscribe_async('ticker', {'symbol': 'BTC'}):
+                print(event['result'])
+        """
+        message = self._get_message()
+        request_kwargs = self._prepare_request_data(method, params, dict_config)
+        request_kwargs['url'] = self.url.rstrip('/') + SUBSCRIBE_PATH
+        if headers:
+            request_kwargs['headers'].update(headers)
+        decoder = FrameDecoder()
+        # 订阅是长连接，事件之间可能长时间没有数据，不设置读取超时
+        async with self.client_async.stream('POST', timeout=None, **request_kwargs) as response:
+            async for chunk in response.aiter_bytes():
+                for frame in decoder.feed(chunk):
+                    yield message.decode(frame)
+
     def call_model(
             self,
             params: BaseModel,
             headers: dict[str, str] | None = None,
-            dict_config: Optional[DictConfig] = None
+            dict_config: Optional[DictConfig] = None,
+            lazy: bool = False,
+            raw: bool = False,
+            columnar: bool = False
     ) -> Any:
         """
         根据 `BaseModel` 子类实例中在 `Config` 类或 `model_config` 中声明的 `method_name`
@@ -177,6 +373,9 @@ class RpcClient:
                 params (BaseModel): 包含方法调用所需参数和在模型配置中声明的 `method_name` 的 `BaseModel` 子类实例。
                 headers (dict[str, str] | None):  请求头部
                 dict_config (BaseModel): 用来过滤 BaseModel 模型字段 和 BaseModel.model_dump() 参数和效果都一致
+                lazy (bool): 为 True 时返回 `LazyResponse`，`result` 在访问时才解码
+                raw (bool): 为 True 时 `result` 为未解码的编码字节
+                columnar (bool): 为 True 时请求以列式编码返回记录列表
 
             Returns:
                 Any: RPC调用的结果。如果 `method_name` 未定义，则返回一个包含错误信息的字典。
@@ -189,13 +388,16 @@ class RpcClient:
                          'method_name method name under the Config class'
             }
             return data
-        return self.call(str(method_name), params, headers, dict_config)
+        return self.call(str(method_name), params, headers, dict_config, lazy, raw, columnar)
 
     async def call_model_async(
             self,
             params: BaseModel,
             headers: dict[str, str] | None = None,
-            dict_config: Optional[DictConfig] = None
+            dict_config: Optional[DictConfig] = None,
+            lazy: bool = False,
+            raw: bool = False,
+            columnar: bool = False
     ) -> Any:
         """
         根据 `BaseModel` 子类实例中在 `Config` 类或 `model_config` 中声明的 `method_name`
@@ -235,6 +437,9 @@ class RpcClient:
             params (BaseModel): 包含方法调用所需参数和在模型配置中声明的 `method_name` 的 `BaseModel` 子类实例。
             headers (dict[str, str] | None):  请求头部
             dict_config (BaseModel): 用来过滤 BaseModel 模型字段 和 BaseModel.model_dump() 参数和效果都一致
+            lazy (bool): 为 True 时返回 `LazyResponse`，`result` 在访问时才解码
+            raw (bool): 为 True 时 `result` 为未解码的编码字节
+            columnar (bool): 为 True 时请求以列式编码返回记录列表
 
         Returns:
             Any: RPC调用的结果。如果 `method_name` 未定义，则返回一个包含错误信息的字典。
@@ -245,4 +450,4 @@ class RpcClient:
                 'error': 'The rpc client request parameter model has not yet set the '
                          'method_name method name under the model_config class'
             }
-        return await self.call_async(str(method_name), params, headers, dict_config)
+        return await self.call_async(str(method_name), params, headers, dict_config, lazy, raw, columnar)
@@ -0,0 +1,106 @@
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+# 请求头：客户端要求以列式编码返回结果
+COLUMNAR_HEADER = 'X-Krpc-Result'
+COLUMNAR = 'columnar'
+# 列式结果的标记键
+COLUMNAR_KEY = '__columnar__'
+
+_PRIMITIVE_TYPES = (str, int, float, bool, type(None))
+
+
+def _encode_column(column: List[Any]) -> List[Any]:
+    for value in column:
+        if type(value) not in _PRIMITIVE_TYPES:
+            from fastapi.encoders import jsonable_encoder
+
+            return jsonable_encoder(column)
+    return column
+
+
+def to_columnar(rows: Any) -> Optional[Dict[str, Any]]:
+    """
+    将同构的字典列表或同一 `BaseModel` 子类的实例列表转换为列式结果：
+    字段名只出现一次，每个字段的值组成一列，返回值已是可直接编码的形式。无法转换时返回 None。
+    """
+    if not isinstance(rows, (list, tuple)) or not rows:
+        return None
+    first = rows[0]
+    if isinstance(first, dict):
+        keys = first.keys()
+        if not all(isinstance(row, dict) and row.keys() == keys for row in rows):
+            return None
+        fields = list(keys)
+        columns = [_encode_column([row[field] for row in rows]) for field in fields]
+    elif isinstance(first, BaseModel):
+        model = type(first)
+        if not all(type(row) is model for row in rows):
+            return None
+        # 与 `jsonable_encoder` 一样经过模型的序列化器，遵循 exclude、computed_field、字段序列化器和别名
+        dumped = [row.model_dump(mode='json', by_alias=True) for row in rows]
+        keys = dumped[0].keys()
+        if not all(row.keys() == keys for row in dumped):
+            return None
+        fields = list(keys)
+        columns = [[row[field] for row in dumped] for field in fields]
+    else:
+        return None
+    return {COLUMNAR_KEY: {'fields': fields, 'columns': columns}}
+
+
+def is_columnar(result: Any) -> bool:
+    return isinstance(result, Mapping) and COLUMNAR_KEY in result
+
+
+class ColumnarRows(Sequence):
+    """
+    列式结果的行视图。按下标访问时才组装对应的行字典，
+    也可以通过 `columns` 直接获取各列，或通过 `to_numpy()` 转换为 NumPy 数组。
+    """
+
+    def __init__(self, fields: List[str], columns: List[List[Any]]):
+        self.fields = list(fields)
+        self._columns = [list(column) for column in columns]
+        self._length = len(self._columns[0]) if self._columns else 0
+
+    @classmethod
+    def from_result(cls, result: Any) -> 'ColumnarRows':
+        data = result[COLUMNAR_KEY]
+        return cls(data['fields'], data['columns'])
+
+    @property
+    def columns(self) -> Dict[str, List[Any]]:
+        return dict(zip(self.fields, self._columns))
+
+    def to_numpy(self) -> Dict[str, Any]:
+        """返回 `{字段名: numpy.ndarray}`，需要安装 numpy。"""
+        try:
+            import numpy
+        except ImportError as e:
+            raise ImportError("ColumnarRows.to_numpy requires 'numpy', install it with `pip install numpy`") from e
+        return {field: numpy.asarray(column) for field, column in zip(self.fields, self._columns)}
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('row index out of range')
+        return {field: column[index] for field, column in zip(self.fields, self._columns)}
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, ColumnarRows):
+            return self.fields == other.fields and self._columns == other._columns
+        if isinstance(other, (list, tuple)):
+            return len(other) == self._length and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"ColumnarRows(fields={self.fields!r}, rows={self._length})"
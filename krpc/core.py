@@ -1,6 +1,17 @@
 import logging
-from fastapi import APIRouter, Request
-from .message import Message, JsonMessage, message_management
+import time
+from typing import Any, Callable, Optional, Tuple, Union
+from fastapi import APIRouter, Request, Response
+from .asgi import RpcASGIApp
+from .capture import SERVER_TIME_HEADER, TIMING_HEADER, TrafficRecorder
+from .depends import Resources
+from .message import SUBSCRIBE_PATH, Message, JsonMessage, message_management
+from .method import RpcMethod
+from .shm import SHM_HEADER
+from .subscription import DROP_OLDEST, Broadcaster, SubscriptionMethod, stream_events
+
+# 由客户端传输层或回放工具自行设置的请求头，不写入采集日志
+_UNRECORDED_HEADERS = ('x-krpc-type', TIMING_HEADER.lower(), SHM_HEADER.lower())
 
 
 class Entrypoint(APIRouter):
@@ -9,25 +20,72 @@ class Entrypoint(APIRouter):
             path: str,
             default_rpc_media_type: str = 'json',
             cust_messages: dict[str, Message] = None,
+            include_method_routes: bool = True,
             **kwargs
     ):
+        """
+        :param path: RPC 入口路径。
+        :param default_rpc_media_type: 请求未指定 `X-Krpc-Type` 时使用的编码类型。
+        :param cust_messages: 自定义消息处理器字典。
+        :param include_method_routes: 是否为每个方法注册 `POST {path}/{method}` 路由。
+                                      这些路由只用于生成文档，使用 `asgi_app()` 且不需要文档时可以关闭。
+        """
         super().__init__(**kwargs)
         self.path = path
         self.default_rpc_media_type = default_rpc_media_type
+        self.include_method_routes = include_method_routes
         self.messages = cust_messages or message_management
         self.logger = logging.getLogger("fastapi")
+        self.resources = Resources()
+        self.rpc_methods: dict[str, RpcMethod] = {}
+        self.rpc_subscriptions: dict[str, SubscriptionMethod] = {}
+        self.broadcaster = Broadcaster()
+        self.recorder: Optional[TrafficRecorder] = None
+        self.add_event_handler("startup", self.resources.startup)
+        self.add_event_handler("shutdown", self.resources.shutdown)
+        self.add_event_handler("shutdown", self.stop_capture)
         self.add_api_route(self.path, self.rpc_endpoint, methods=["POST"])
 
     async def rpc_endpoint(self, request: Request):
         message = self.get_message(request)
-        return await message.request_handle(request, self.routes)
+        timing = TIMING_HEADER in request.headers
+        if self.recorder is None and not timing:
+            return await message.request_handle(request, self.rpc_methods, self.resources)
+        content, seconds = await self.dispatch(message, await request.body(), request)
+        headers = {SERVER_TIME_HEADER: repr(seconds)} if timing else None
+        return Response(content, media_type=message.rpc_media_type, headers=headers)
+
+    async def dispatch(self, message: Message, body: bytes, request: Optional[Request] = None) -> Tuple[bytes, float]:
+        """处理已读取的请求体，返回编码后的响应和处理耗时（秒），开启流量采集时按比例记录请求。"""
+        timer = time.perf_counter()
+        content = await message.handle(body, self.rpc_methods, self.resources, request)
+        seconds = time.perf_counter() - timer
+        recorder = self.recorder
+        if recorder is not None and recorder.sample():
+            headers = {}
+            if request is not None:
+                headers = {name: value for name, value in request.headers.items()
+                           if name.startswith('x-krpc-') and name not in _UNRECORDED_HEADERS}
+            recorder.record(self.path, message.rpc_media_type, headers, body, time.time() - seconds, seconds)
+        return content, seconds
+
+    async def subscribe_endpoint(self, request: Request):
+        from starlette.responses import StreamingResponse
+
+        message = self.get_message(request)
+        events = stream_events(
+            message, await request.body(), self.rpc_subscriptions, self.broadcaster, self.resources, request
+        )
+        return StreamingResponse(events, media_type=message.rpc_media_type)
 
     @staticmethod
     def get_current_rpc_media_type(request: Request):
         return request.headers.get("X-Krpc-Type", "").lower()
 
     def get_message(self, request: Request) -> Message:
-        current_rpc_media_type = self.get_current_rpc_media_type(request)
+        return self.get_message_by_type(self.get_current_rpc_media_type(request))
+
+    def get_message_by_type(self, current_rpc_media_type: str) -> Message:
         message = self.messages.get(current_rpc_media_type) or self.messages.get(self.default_rpc_media_type)
         if not message:
             self.logger.warning(
@@ -37,6 +95,79 @@ class Entrypoint(APIRouter):
             message = JsonMessage()
         return message
 
-    def method(self, func):
-        self.add_api_route(self.path + "/" + func.__name__, func, methods=["POST"])
-        return func
+    def resource(self, func):
+        """
+        注册进程级单例资源，RPC 方法通过 `Depends(func)` 获取。
+        资源在应用启动时创建、关闭时清理，生成器函数 `yield` 之后的代码即为清理逻辑。
+        """
+        return self.resources.register(func)
+
+    def method(self, func=None, *, columnar: bool = False, etag: Union[bool, Callable[[Any], Any]] = False):
+        """
+        注册 RPC 方法，可以直接用作装饰器 `@api_v1.method`，也可以带参数使用 `@api_v1.method(columnar=True)`。
+
+        :param columnar: 为 True 时，返回同构字典或模型列表的结果总是以列式编码返回；
+                         否则仅在客户端通过 `X-Krpc-Result: columnar` 请求时使用列式编码。
+        :param etag: 为 True 时根据编码后的结果计算 ETag，也可以传入根据结果返回版本号的函数。
+                     客户端携带的 ETag 与之相同时只返回不含结果的 `not_modified` 响应。
+        """
+        def decorator(f):
+            self.rpc_methods[f.__name__] = RpcMethod(f, columnar=columnar, etag=etag)
+            if self.include_method_routes:
+                self.add_api_route(self.path + "/" + f.__name__, f, methods=["POST"])
+            return f
+
+        if func is None:
+            return decorator
+        return decorator(func)
+
+    def subscribe(self, func=None, *, queue_size: int = 100, policy: str = DROP_OLDEST, shared: Optional[bool] = None):
+        """
+        注册订阅方法，处理函数是一个异步生成器，每次 `yield` 推送一个事件。
+        订阅请求发送到 `POST {path}/_subscribe`，事件按请求的编码类型编码后通过长连接逐帧返回，
+        客户端使用 `RpcClient.subscribe_async()` 接收。
+        方法名和参数相同的订阅共享同一个生产者（见 `shared`），最后一个订阅者断开时生产者随之关闭。
+
+        :param queue_size: 每个订阅者的事件队列长度。
+        :param policy: 订阅者队列已满时的处理策略：
+                       `drop_oldest`（丢弃最早的事件）、`drop_newest`（丢弃新事件）、
+                       `block`（生产者等待，同一主题的所有订阅者随之减速）、`disconnect`（断开该订阅者）。
+        :param shared: 方法名和参数相同的订阅是否共享生产者。默认在处理函数不依赖 `Request` 或 `Depends` 时共享；
+                       否则每个订阅者使用各自的生产者和依赖作用域，避免事件按第一个订阅者的请求生成。
+        """
+        def decorator(f):
+            if not self.rpc_subscriptions:
+                self.add_api_route(self.path + SUBSCRIBE_PATH, self.subscribe_endpoint, methods=["POST"])
+            self.rpc_subscriptions[f.__name__] = SubscriptionMethod(
+                f, queue_size=queue_size, policy=policy, shared=shared
+            )
+            return f
+
+        if func is None:
+            return decorator
+        return decorator(func)
+
+    def capture(self, path: str, sample_rate: float = 1.0, max_bytes: Optional[int] = None) -> TrafficRecorder:
+        """
+        开始采集 RPC 请求（请求体、编码类型和处理耗时），写入长度前缀分帧的 msgpack 日志，
+        可通过 `krpc replay` 回放，参数见 `TrafficRecorder`。应用关闭时自动停止采集。
+        """
+        self.stop_capture()
+        self.recorder = TrafficRecorder(path, sample_rate=sample_rate, max_bytes=max_bytes)
+        return self.recorder
+
+    def stop_capture(self) -> None:
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def stats(self) -> dict[str, dict]:
+        """返回每个方法的调用统计 `{method: {calls, errors, seconds}}`。"""
+        return {name: method.stats() for name, method in self.rpc_methods.items()}
+
+    def asgi_app(self) -> RpcASGIApp:
+        """
+        返回共享该入口方法表的纯 ASGI 应用，跳过 FastAPI 路由匹配和 `Response` 对象。
+        可以直接运行 `uvicorn.run(api_v1.asgi_app())`，或通过 `app.mount(path, api_v1.asgi_app())` 挂载。
+        """
+        return RpcASGIApp(self)
@@ -0,0 +1,129 @@
+import asyncio
+import inspect
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Request, params
+
+
+@lru_cache(maxsize=None)
+def dependency_params(func: Callable) -> Dict[str, params.Depends]:
+    """返回函数中以 `Depends(...)` 作为默认值的参数，结果按函数缓存。"""
+    return {
+        name: param.default
+        for name, param in inspect.signature(func).parameters.items()
+        if isinstance(param.default, params.Depends)
+    }
+
+
+@lru_cache(maxsize=None)
+def request_params(func: Callable) -> tuple:
+    """返回函数中注解为 `Request` 的参数名，结果按函数缓存。"""
+    return tuple(
+        name for name, param in inspect.signature(func).parameters.items()
+        if param.annotation is Request
+    )
+
+
+async def _call(func: Callable, kwargs: Dict[str, Any], stack: AsyncExitStack) -> Any:
+    """调用依赖函数，生成器依赖的清理逻辑交给 `stack` 在作用域结束时执行。"""
+    if inspect.isasyncgenfunction(func):
+        return await stack.enter_async_context(asynccontextmanager(func)(**kwargs))
+    if inspect.isgeneratorfunction(func):
+        return stack.enter_context(contextmanager(func)(**kwargs))
+    value = func(**kwargs)
+    if inspect.isawaitable(value):
+        value = await value
+    return value
+
+
+class Resources:
+    """
+    进程级单例资源（连接池、HTTP 客户端等）。
+
+    资源在应用启动时创建、关闭时清理；若未经过生命周期（例如测试中直接使用 `ASGITransport`），
+    则在首次使用时创建。资源本身也可以通过 `Depends(...)` 依赖其他资源。
+    """
+
+    def __init__(self) -> None:
+        self._factories: list[Callable] = []
+        self._values: Dict[Callable, Any] = {}
+        self._stack: Optional[AsyncExitStack] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def register(self, func: Callable) -> Callable:
+        if func not in self._factories:
+            self._factories.append(func)
+        return func
+
+    def __contains__(self, func: Callable) -> bool:
+        return func in self._factories
+
+    async def startup(self) -> None:
+        for func in self._factories:
+            await self.get(func)
+
+    async def shutdown(self) -> None:
+        stack, self._stack = self._stack, None
+        self._values.clear()
+        if stack is not None:
+            await stack.aclose()
+
+    async def get(self, func: Callable) -> Any:
+        if func in self._values:
+            return self._values[func]
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            return await self._create(func)
+
+    async def _create(self, func: Callable) -> Any:
+        if func in self._values:
+            return self._values[func]
+        if self._stack is None:
+            self._stack = AsyncExitStack()
+        kwargs = {}
+        for name, depends in dependency_params(func).items():
+            if depends.dependency not in self:
+                raise TypeError(
+                    f"krpc resource '{func.__name__}' can only depend on other resources, "
+                    f"got '{getattr(depends.dependency, '__name__', depends.dependency)}'"
+                )
+            kwargs[name] = await self._create(depends.dependency)
+        value = await _call(func, kwargs, self._stack)
+        self._values[func] = value
+        return value
+
+
+class DependencyScope:
+    """
+    单次 RPC 请求的依赖作用域。同一作用域内 `use_cache=True` 的依赖只求值一次，
+    生成器依赖的清理逻辑在作用域关闭时执行。
+    """
+
+    def __init__(self, resources: Optional[Resources] = None, request: Optional[Request] = None) -> None:
+        self.resources = resources
+        self.request = request
+        self.cache: Dict[Callable, Any] = {}
+        self.stack = AsyncExitStack()
+
+    async def solve(self, depends: params.Depends) -> Any:
+        func = depends.dependency
+        if self.resources is not None and func in self.resources:
+            return await self.resources.get(func)
+        if depends.use_cache and func in self.cache:
+            return self.cache[func]
+        value = await _call(func, await self.solve_kwargs(func), self.stack)
+        if depends.use_cache:
+            self.cache[func] = value
+        return value
+
+    async def solve_kwargs(self, func: Callable) -> Dict[str, Any]:
+        kwargs = {name: self.request for name in request_params(func)}
+        for name, depends in dependency_params(func).items():
+            kwargs[name] = await self.solve(depends)
+        return kwargs
+
+    async def close(self) -> None:
+        await self.stack.aclose()
@@ -0,0 +1,346 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Sequence
+
+from .client import RpcClient
+from .errors import RpcErrorCode
+
+# 传输失败（连接错误、超时等）时使用的错误名称
+TRANSPORT_ERROR = 'TRANSPORT_ERROR'
+
+
+class Histogram:
+    """
+    HDR 风格的对数线性延迟直方图，记录微秒整数值。
+    每个 2 的幂区间再等分为 `2 ** (precision - 1)` 个子桶，相对误差不超过 `1 / 2 ** (precision - 1)`，
+    桶以字典稀疏存储，便于在进程间传递和合并。
+    """
+
+    def __init__(self, precision: int = 8):
+        self.precision = precision
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    def bucket(self, value: int) -> int:
+        """返回值所在桶的下界。"""
+        shift = value.bit_length() - self.precision
+        if shift <= 0:
+            return value
+        return (value >> shift) << shift
+
+    def bucket_upper(self, bucket: int) -> int:
+        """返回桶内的最大值，即 HDR 中的 highest equivalent value。"""
+        shift = bucket.bit_length() - self.precision
+        if shift <= 0:
+            return bucket
+        return bucket + (1 << shift) - 1
+
+    def record(self, value: int) -> None:
+        value = max(0, int(value))
+        bucket = self.bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: 'Histogram') -> None:
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentile(self, q: float) -> int:
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(q / 100 * self.count))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self.bucket_upper(bucket), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'precision': self.precision,
+            'counts': self.counts,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Histogram':
+        histogram = cls(data['precision'])
+        histogram.counts = {int(bucket): count for bucket, count in data['counts'].items()}
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        return histogram
+
+
+def load_mix(path: str) -> List[Dict[str, Any]]:
+    """
+    读取请求组合文件：JSON 数组，每项为 `{"method": ..., "params": {...}, "weight": 1}`，
+    `params` 与 `RpcClient.call` 的参数相同（`call_model` 的模型可用 `model_dump()` 的结果），
+    `weight` 为该请求被选中的相对权重。
+    """
+    with open(path) as f:
+        mix = json.load(f)
+    if not isinstance(mix, list) or not mix:
+        raise ValueError(f"krpc load mix file must contain a non-empty JSON array: {path}")
+    for entry in mix:
+        if 'method' not in entry:
+            raise ValueError(f"krpc load mix entry is missing 'method': {entry}")
+        entry.setdefault('params', {})
+        entry.setdefault('weight', 1)
+    return mix
+
+
+def error_name(error: Any) -> str:
+    """将响应中的错误归类为 `RpcErrorCode` 名称，传输失败时为 `TRANSPORT_ERROR`。"""
+    if isinstance(error, dict) and 'code' in error:
+        for code in RpcErrorCode:
+            if code.value[0] == error['code']:
+                return code.name
+        return f"CODE_{error['code']}"
+    return TRANSPORT_ERROR
+
+
+def build_client(url: Optional[str], app: Optional[str], path: Optional[str], rpc_media_type: str) -> RpcClient:
+    """创建压测客户端：指定 `app` 时在进程内通过 ASGITransport 调用，否则通过网络调用 `url`。"""
+    if app is None:
+        return RpcClient(url, rpc_media_type=rpc_media_type, etag_cache_size=0)
+
+    import httpx
+
+    from .replay import load_app
+    from .server import find_entrypoints
+
+    asgi_app = load_app(app)
+    if path is None:
+        entrypoints = find_entrypoints(asgi_app)
+        if len(entrypoints) != 1:
+            raise ValueError(
+                f"krpc load expected one Entrypoint in the app, found {len(entrypoints)}, specify one with --path"
+            )
+        path = entrypoints[0].path
+    return RpcClient(
+        'http://krpc' + path, rpc_media_type=rpc_media_type,
+        transport=httpx.ASGITransport(app=asgi_app), etag_cache_size=0,
+    )
+
+
+async def run_load(
+        client: RpcClient,
+        mix: List[Dict[str, Any]],
+        rate: float,
+        duration: float,
+        concurrency: int = 256,
+        seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    以固定到达速率（开环）调用 `mix` 中的方法，返回统计结果。
+
+    第 i 个请求的计划发送时间为 `i / rate`，与之前的请求是否完成无关。进行中的请求达到 `concurrency` 时，
+    新请求会排队等待，延迟从计划发送时间开始计算，因此服务变慢时排队时间也会计入，避免协调遗漏（coordinated omission）。
+
+    :param rate: 每秒请求数。
+    :param duration: 持续时间（秒）。
+    :param concurrency: 最大并发请求数。
+    :param seed: 选择请求的随机种子。
+    """
+    chooser = random.Random(seed)
+    weights = [entry['weight'] for entry in mix]
+    semaphore = asyncio.Semaphore(concurrency)
+    latency = Histogram()
+    service = Histogram()
+    errors: Dict[str, int] = {}
+    stats = {'sent': 0, 'ok': 0}
+
+    async def call(entry: Dict[str, Any], intended: float) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.call_async(entry['method'], entry['params'])
+            finished = time.perf_counter()
+        latency.record((finished - intended) * 1e6)
+        service.record((finished - started) * 1e6)
+        error = response.get('error') if isinstance(response, dict) else None
+        if error is None:
+            stats['ok'] += 1
+        else:
+            name = error_name(error)
+            errors[name] = errors.get(name, 0) + 1
+
+    total = int(rate * duration)
+    tasks = set()
+    start = time.perf_counter()
+    for index in range(total):
+        intended = start + index / rate
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        entry = chooser.choices(mix, weights)[0]
+        task = asyncio.create_task(call(entry, intended))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        stats['sent'] += 1
+    if tasks:
+        await asyncio.gather(*tasks)
+    return {
+        'sent': stats['sent'],
+        'ok': stats['ok'],
+        'errors': errors,
+        'elapsed': time.perf_counter() - start,
+        'latency': latency.to_dict(),
+        'service': service.to_dict(),
+    }
+
+
+def _run_process(options: Dict[str, Any]) -> Dict[str, Any]:
+    """压测进程入口，返回可以跨进程传递的统计结果。"""
+
+    async def run() -> Dict[str, Any]:
+        client = build_client(options['url'], options['app'], options['path'], options['rpc_media_type'])
+        try:
+            return await run_load(
+                client, options['mix'], options['rate'], options['duration'],
+                options['concurrency'], options['seed'],
+            )
+        finally:
+            await client.client_async.aclose()
+
+    return asyncio.run(run())
+
+
+def merge_results(results: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    latency = Histogram()
+    service = Histogram()
+    errors: Dict[str, int] = {}
+    for result in results:
+        latency.merge(Histogram.from_dict(result['latency']))
+        service.merge(Histogram.from_dict(result['service']))
+        for name, count in result['errors'].items():
+            errors[name] = errors.get(name, 0) + count
+    elapsed = max((result['elapsed'] for result in results), default=0.0)
+    completed = latency.count
+    return {
+        'sent': sum(result['sent'] for result in results),
+        'ok': sum(result['ok'] for result in results),
+        'errors': errors,
+        'elapsed': elapsed,
+        'throughput': completed / elapsed if elapsed else 0.0,
+        'latency': latency.to_dict(),
+        'service': service.to_dict(),
+    }
+
+
+def load(
+        mix: List[Dict[str, Any]],
+        rate: float,
+        duration: float,
+        url: Optional[str] = None,
+        app: Optional[str] = None,
+        path: Optional[str] = None,
+        rpc_media_type: str = 'json',
+        concurrency: int = 256,
+        processes: int = 1,
+        seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    运行压测并返回合并后的结果。`processes` 大于 1 时在多个进程中各以 `rate / processes` 的速率发送请求。
+
+    :param url: RPC 入口的完整 URL。
+    :param app: `module:attribute` 形式的 ASGI 应用路径，指定时在进程内调用，不经过网络。
+    :param path: 进程内调用时的入口路径，应用中只有一个 `Entrypoint` 时可以省略。
+    """
+    if (url is None) == (app is None):
+        raise ValueError("krpc load requires exactly one of 'url' or 'app'")
+    options = [{
+        'url': url,
+        'app': app,
+        'path': path,
+        'rpc_media_type': rpc_media_type,
+        'mix': mix,
+        'rate': rate / processes,
+        'duration': duration,
+        'concurrency': concurrency,
+        'seed': None if seed is None else seed + index,
+    } for index in range(processes)]
+    if processes == 1:
+        return merge_results([_run_process(options[0])])
+    with ProcessPoolExecutor(processes, mp_context=get_context('spawn')) as executor:
+        return merge_results(list(executor.map(_run_process, options)))
+
+
+def format_result(result: Dict[str, Any], rate: float) -> str:
+    latency = Histogram.from_dict(result['latency'])
+    service = Histogram.from_dict(result['service'])
+    errors = sum(result['errors'].values())
+    lines = [
+        f"requests   : {result['sent']} sent, {result['ok']} ok, {errors} errors in {result['elapsed']:.2f}s",
+        f"throughput : {result['throughput']:.1f} req/s (target {rate:.1f} req/s)",
+    ]
+    for name, count in sorted(result['errors'].items()):
+        lines.append(f"  {name:<24} {count}")
+    lines.append(f"{'percentile':>12} {'latency ms':>12} {'service ms':>12}")
+    for q in (50, 75, 90, 99, 99.9, 99.99, 100):
+        lines.append(f"{q:>11}% {latency.percentile(q) / 1000:>12.3f} {service.percentile(q) / 1000:>12.3f}")
+    lines.append(f"{'mean':>12} {latency.mean / 1000:>12.3f} {service.mean / 1000:>12.3f}")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='krpc-load',
+        description='以固定到达速率（开环）压测 krpc 服务，报告吞吐量、按 RpcErrorCode 分类的错误和延迟分布。'
+                    'latency 从计划发送时间开始计算，service 从实际发送时间开始计算。',
+    )
+    parser.add_argument('mix', help='请求组合文件（JSON 数组，每项包含 method、params 和 weight）')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='RPC 入口的完整 URL')
+    target.add_argument('--app', help='`module:attribute` 形式的 ASGI 应用路径，在进程内调用，不经过网络')
+    parser.add_argument('--path', default=None, help='进程内调用时的入口路径，应用中只有一个 Entrypoint 时可以省略')
+    parser.add_argument('-r', '--rate', type=float, default=100.0, help='每秒请求数，默认 100')
+    parser.add_argument('-d', '--duration', type=float, default=10.0, help='持续时间（秒），默认 10')
+    parser.add_argument('-c', '--concurrency', type=int, default=256, help='每个进程的最大并发请求数，默认 256')
+    parser.add_argument('-p', '--processes', type=int, default=1, help='压测进程数，默认 1')
+    parser.add_argument('-t', '--type', default='json', help='消息编码类型（X-Krpc-Type），默认 json')
+    parser.add_argument('--seed', type=int, default=None, help='选择请求的随机种子')
+    parser.add_argument('--json', default=None, help='将结果写入 JSON 文件')
+    args = parser.parse_args(argv)
+
+    result = load(
+        load_mix(args.mix), args.rate, args.duration,
+        url=args.url, app=args.app, path=args.path, rpc_media_type=args.type,
+        concurrency=args.concurrency, processes=args.processes, seed=args.seed,
+    )
+    print(format_result(result, args.rate))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
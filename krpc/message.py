@@ -1,17 +1,66 @@
-import inspect
+import hashlib
 import json
-from typing import Any, Dict, Union, get_type_hints
-import msgpack
-from fastapi import Request, Response
-from fastapi.encoders import jsonable_encoder
-from pydantic import BaseModel
+import time
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple, Union
 
+from .columnar import COLUMNAR, COLUMNAR_HEADER, to_columnar
 from .errors import RpcException, RpcErrorCode
 from .models import RpcRequestModel, RpcResponseModel
 
+# 服务端相关模块（FastAPI/Starlette）和 msgpack 只在首次使用时导入，
+# 使仅使用 RpcClient 和编码器的进程不必加载它们
+if TYPE_CHECKING:
+    import msgpack
+    from starlette.requests import Request
+    from starlette.responses import Response
+
+    from .depends import Resources
+    from .method import RpcMethod
+
+
+# 请求头：客户端缓存的结果 ETag
+IF_NONE_MATCH_HEADER = 'X-Krpc-If-None-Match'
+# 订阅请求的路径后缀，相对于 `Entrypoint.path`
+SUBSCRIBE_PATH = '/_subscribe'
+
+
+def encode_frame(payload: bytes) -> bytes:
+    """订阅响应中的每个事件以 4 字节大端长度前缀加编码后的内容组成一帧，二进制编码也能直接分帧。"""
+    return len(payload).to_bytes(4, 'big') + payload
+
+
+class FrameDecoder:
+    """从任意切分的字节块中解析出完整的帧。"""
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[bytes]:
+        self.buffer += data
+        frames = []
+        while len(self.buffer) >= 4:
+            size = int.from_bytes(self.buffer[:4], 'big')
+            if len(self.buffer) < 4 + size:
+                break
+            frames.append(bytes(self.buffer[4:4 + size]))
+            del self.buffer[:4 + size]
+        return frames
+
+
+class JsonableResult:
+    """已转换为可编码形式的结果，编码响应时不再经过 `jsonable_encoder`。"""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any):
+        self.value = value
+
 
 class Message:
     rpc_media_type: str | None = None
+    # 是否能在不解码 `result` 的情况下拆分响应（见 `split_response`）
+    lazy_result: bool = False
 
     def decode(self, data: bytes) -> Dict[str, Any] | None:
         raise NotImplementedError
@@ -19,79 +68,194 @@ class Message:
     def encode(self, data: Dict[str, Any]) -> bytes | None:
         raise NotImplementedError
 
-    async def request_handle(self, request: Request, routes: list) -> Response:
+    def split_response(self, data: bytes) -> Tuple[Dict[str, Any], bytes | None]:
+        """
+        拆分响应：返回不含 `result` 的信封，以及 `result` 的已编码字节。
+        默认实现完整解码后重新编码 `result`，编码器可覆盖以避免解码 `result`。
+        """
+        envelope = self.decode(data)
+        if 'result' not in envelope:
+            return envelope, None
+        return envelope, self.encode(envelope.pop('result'))
+
+    def decode_lazy(self, data: bytes) -> Any:
+        """解码 `split_response` 拆出的 `result` 字节，编码器可覆盖为按需解码。"""
+        return self.decode(data)
+
+    def join_response(self, response_id: Union[str, int, None], raw_result: bytes, etag: str) -> bytes:
+        """
+        `split_response` 的逆操作：将已编码的 `result` 字节放入信封，返回与 `encode_response` 相同的响应。
+        默认实现解码后重新编码，编码器可覆盖为直接拼接字节。
+        """
+        return self.encode({'id': response_id, 'result': self.decode(raw_result), 'error': None, 'etag': etag})
+
+    async def request_handle(
+            self,
+            request: 'Request',
+            methods: Dict[str, 'RpcMethod'],
+            resources: Optional['Resources'] = None
+    ) -> 'Response':
+        from starlette.responses import Response
+
+        content = await self.handle(await request.body(), methods, resources, request)
+        return Response(
+            content,
+            media_type=self.rpc_media_type,
+        )
+
+    async def handle(
+            self,
+            body: bytes,
+            methods: Dict[str, 'RpcMethod'],
+            resources: Optional['Resources'] = None,
+            request: Optional['Request'] = None
+    ) -> bytes:
+        """处理已读取的请求体并返回编码后的响应字节，与具体的 HTTP 框架无关。"""
         try:
 
-            req_data = self.decode(await request.body())
+            req_data = self.decode(body)
             req = RpcRequestModel(**req_data)
         except Exception as _:
-            return self.response_handle(
+            return self.encode_response(
                 error=RpcException.parse(RpcErrorCode.PARSE_ERROR)
             )
 
         response_id = req.id
 
-        for route in routes:
-            if route.path == request.url.path + "/" + req.method:
-                try:
-                    # 获取方法的参数名称和类型
-                    signature = inspect.signature(route.endpoint)
-                    parameters = signature.parameters
-
-                    # 构造参数字典
-                    kwargs = {}
-                    for param_name, param in parameters.items():
-                        if param_name in req.params:
-                            param_type = get_type_hints(route.endpoint).get(param_name, Any)
-                            if issubclass(param_type, BaseModel):
-                                kwargs[param_name] = param_type(**req.params[param_name])
-                            else:
-                                kwargs[param_name] = req.params[param_name]
-                        elif param.default == inspect.Parameter.empty:
-                            # 没有按照填写必须的参数数据
-                            return self.response_handle(
-                                response_id=response_id, error=RpcException.parse(
-                                    RpcErrorCode.INVALID_PARAMS,
-                                    f"Missing required parameter: {param_name}"
-                                )
-                            )
-
-                    result = await route.endpoint(**kwargs)
-                    return self.response_handle(
-                        response_id=response_id, result=result
-                    )
-                except Exception as _:
-                    return self.response_handle(
-                        response_id=response_id,
-                        error=RpcException.parse(RpcErrorCode.INVALID_PARAMS)
-                    )
-
-        return self.response_handle(
-            response_id=response_id,
-            error=RpcException.parse(RpcErrorCode.METHOD_NOT_FOUND)
-        )
+        method = methods.get(req.method)
+        if method is None:
+            return self.encode_response(
+                response_id=response_id,
+                error=RpcException.parse(RpcErrorCode.METHOD_NOT_FOUND)
+            )
+
+        started = time.perf_counter()
+        result, error = await self.call_method(method, req.params, resources, request)
+        method.observe(time.perf_counter() - started, error is not None)
+        if error is not None:
+            return self.encode_response(response_id=response_id, error=error)
+        if method.etag and method.etag is not True:
+            # 声明的版本号根据方法的原始返回值计算，不受列式转换影响
+            try:
+                etag = str(method.etag(result))
+            except Exception as _:
+                return self.encode_response(
+                    response_id=response_id,
+                    error=RpcException.parse(RpcErrorCode.INTERNAL_ERROR)
+                )
+            if request is not None and request.headers.get(IF_NONE_MATCH_HEADER) == etag:
+                return self.encode_response(response_id=response_id, etag=etag, not_modified=True)
+        if method.columnar or self.columnar_requested(request):
+            columnar = to_columnar(result)
+            if columnar is not None:
+                result = JsonableResult(columnar)
+        if not method.etag:
+            return self.encode_response(response_id=response_id, result=result)
+        if method.etag is not True:
+            return self.encode_response(response_id=response_id, result=result, etag=etag)
+
+        try:
+            # 结果只编码一次：用编码后的字节计算 ETag，并直接放入响应
+            if isinstance(result, JsonableResult):
+                raw_result = self.encode(result.value)
+            else:
+                raw_result = self.encode(self.to_jsonable(result))
+        except Exception as _:
+            return self.encode_response(
+                response_id=response_id,
+                error=RpcException.parse(RpcErrorCode.INTERNAL_ERROR)
+            )
+        etag = hashlib.blake2b(raw_result, digest_size=16).hexdigest()
+        if request is not None and request.headers.get(IF_NONE_MATCH_HEADER) == etag:
+            return self.encode_response(response_id=response_id, etag=etag, not_modified=True)
+        return self.join_response(response_id, raw_result, etag)
+
+    @staticmethod
+    def to_jsonable(result: Any) -> Any:
+        """按响应编码时相同的规则将结果转换为可编码形式。"""
+        from fastapi.encoders import jsonable_encoder
+
+        return jsonable_encoder(RpcResponseModel(id=None, result=result))['result']
+
+    @staticmethod
+    def columnar_requested(request: Optional['Request']) -> bool:
+        return request is not None and request.headers.get(COLUMNAR_HEADER, '').lower() == COLUMNAR
+
+    @staticmethod
+    async def call_method(
+            method: 'RpcMethod',
+            params: Dict[str, Any],
+            resources: Optional['Resources'] = None,
+            request: Optional['Request'] = None
+    ) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        """校验参数并调用方法，返回 `(result, error)`。"""
+        from .depends import DependencyScope
+        from .method import ParamsError
+
+        try:
+            # 使用注册时构建的校验器构造参数字典
+            kwargs = method.validate(params)
+        except ParamsError as e:
+            return None, RpcException.parse(RpcErrorCode.INVALID_PARAMS, e.errors)
+
+        scope = DependencyScope(resources, request) if method.has_dependencies else None
+        try:
+            if scope is not None:
+                # 注入 Depends 依赖和 Request
+                kwargs.update(await scope.solve_kwargs(method.endpoint))
+            return await method.endpoint(**kwargs), None
+        except Exception as _:
+            return None, RpcException.parse(RpcErrorCode.INVALID_PARAMS)
+        finally:
+            if scope is not None:
+                await scope.close()
+
+    def encode_response(
+            self,
+            response_id: Union[str, int, None] = None,
+            result: Any = None,
+            error: Union[Dict[str, Any], Any, None] = None,
+            etag: Optional[str] = None,
+            not_modified: bool = False,
+    ) -> bytes:
+        from fastapi.encoders import jsonable_encoder
+
+        if isinstance(result, JsonableResult):
+            # 已是可编码形式（如列式结果），跳过逐项遍历
+            jsonable_data = jsonable_encoder(RpcResponseModel(id=response_id, error=error))
+            jsonable_data['result'] = result.value
+        else:
+            jsonable_data = jsonable_encoder(
+                RpcResponseModel(id=response_id, result=result, error=error)
+            )
+        if etag is not None:
+            jsonable_data['etag'] = etag
+            if not_modified:
+                jsonable_data['not_modified'] = True
+        return self.encode(jsonable_data)
 
     def response_handle(
             self,
             response_id: Union[str, int, None] = None,
             result: Any = None,
             error: Union[Dict[str, Any], Any, None] = None,
-    ) -> Response:
+    ) -> 'Response':
+        from starlette.responses import Response
 
-        jsonable_data = jsonable_encoder(
-            RpcResponseModel(id=response_id, result=result, error=error)
-        )
-        content = self.encode(jsonable_data)
         return Response(
-            content,
+            self.encode_response(response_id, result, error),
             media_type=self.rpc_media_type,
         )
 
 
 class JsonMessage(Message):
     rpc_media_type = "json"
+    lazy_result = True
 
     def decode(self, data: bytes) -> Dict[str, Any] | None:
+        if isinstance(data, memoryview):
+            # 共享内存段的视图，`json.loads` 只接受 bytes/str
+            data = bytes(data)
         return json.loads(data)
 
     def encode(self, data: dict) -> bytes | None:
@@ -99,16 +263,214 @@ class JsonMessage(Message):
         bytes_data = json_str.encode('utf-8')
         return bytes_data
 
+    def join_response(self, response_id: Union[str, int, None], raw_result: bytes, etag: str) -> bytes:
+        return b''.join((
+            b'{"id": ', self.encode(response_id), b', "result": ', raw_result,
+            b', "error": null, "etag": ', self.encode(etag), b'}',
+        ))
+
+    def split_response(self, data: bytes) -> Tuple[Dict[str, Any], bytes | None]:
+        # 只扫描信封头尾定位 result 的范围后直接切片，不解码也不遍历 result
+        try:
+            span = _json_result_span(data)
+        except IndexError:
+            span = None
+        if span is None:
+            # 不是 krpc 格式的信封，完整解码
+            return super().split_response(data)
+        key, start, end, comma = span
+        envelope = json.loads(bytes(data[:key]) + bytes(data[comma + 1:]))
+        return envelope, data[start:end]
+
+
+def _json_skip(data: bytes, pos: int, step: int = 1) -> int:
+    # 跳过空白，step 为 -1 时向前跳过
+    while data[pos] in b' \t\n\r':
+        pos += step
+    return pos
+
+
+def _json_is_key(data: bytes, end: int, name: bytes) -> bool:
+    return data[end - len(name):end] == name and data[_json_skip(data, end)] == ord(':')
+
+
+def _json_head_key(data: bytes, name: bytes) -> int | None:
+    """从头部向后扫描，返回顶层键 name（含引号）的偏移量。"""
+    depth = 0
+    pos = 0
+    while pos < len(data):
+        char = data[pos]
+        if char == ord('"'):
+            end = pos + 1
+            while data[end] != ord('"'):
+                end += 2 if data[end] == ord('\\') else 1
+            end += 1
+            if depth == 1 and end - pos == len(name) and _json_is_key(data, end, name):
+                return pos
+            pos = end
+            continue
+        if char in b'{[':
+            depth += 1
+        elif char in b'}]':
+            depth -= 1
+        pos += 1
+    return None
+
+
+def _json_tail_key(data: bytes, name: bytes) -> int | None:
+    """从尾部向前扫描，返回顶层键 name（含引号）的偏移量。"""
+    depth = 0
+    pos = len(data) - 1
+    while pos >= 0:
+        char = data[pos]
+        if char == ord('"'):
+            # 向前找到字符串的起始引号：前面有奇数个反斜杠的引号是转义的
+            start = pos - 1
+            while True:
+                if start < 0:
+                    return None
+                if data[start] == ord('"'):
+                    escapes = 0
+                    while data[start - escapes - 1] == ord('\\'):
+                        escapes += 1
+                    if escapes % 2 == 0:
+                        break
+                start -= 1
+            if depth == 1 and pos + 1 - start == len(name) and _json_is_key(data, pos + 1, name):
+                return start
+            pos = start - 1
+            continue
+        if char in b'}]':
+            depth += 1
+        elif char in b'{[':
+            depth -= 1
+        pos -= 1
+    return None
+
+
+def _json_result_span(data: bytes) -> Tuple[int, int, int, int] | None:
+    """
+    在 krpc 的 JSON 响应中定位 result。`RpcResponseModel` 中 result 之后紧跟 error，
+    因此从头部扫描到顶层的 "result" 键、从尾部扫描到顶层的 "error" 键，两者之间就是 result 的值；
+    扫描跳过字符串（处理转义）并记录括号深度，信封头尾很短，result 本身不会被扫描。
+    返回 (result 键的偏移量, result 值的起止偏移量, error 键之前逗号的偏移量)，不是该格式时返回 None。
+    """
+    key = _json_head_key(data, b'"result"')
+    if key is None:
+        return None
+    start = _json_skip(data, key + len(b'"result"'))
+    start = _json_skip(data, start + 1)
+    error = _json_tail_key(data, b'"error"')
+    if error is None or error <= start:
+        return None
+    comma = _json_skip(data, error - 1, -1)
+    if data[comma] != ord(','):
+        return None
+    end = _json_skip(data, comma - 1, -1) + 1
+    if end <= start:
+        return None
+    return key, start, end, comma
+
 
 class MsgpackMessage(Message):
     rpc_media_type = "msgpack"
+    lazy_result = True
 
     def decode(self, data: bytes) -> Dict[str, Any] | None:
+        import msgpack
+
         return msgpack.unpackb(data, raw=False)
 
     def encode(self, data: Dict[str, Any]) -> bytes | None:
+        import msgpack
+
         return msgpack.packb(data, use_bin_type=True)
 
+    def split_response(self, data: bytes) -> Tuple[Dict[str, Any], bytes | None]:
+        # 只解码信封中的 id/error，result 通过 skip() 定位偏移量后直接切片，不做解码
+        unpacker = _unpacker(data)
+        envelope = {}
+        raw_result = None
+        for _ in range(unpacker.read_map_header()):
+            key = unpacker.unpack()
+            if key == 'result':
+                start = unpacker.tell()
+                unpacker.skip()
+                raw_result = data[start:unpacker.tell()]
+            else:
+                envelope[key] = unpacker.unpack()
+        return envelope, raw_result
+
+    def join_response(self, response_id: Union[str, int, None], raw_result: bytes, etag: str) -> bytes:
+        import msgpack
+
+        # fixmap 头：id、result、error、etag 四个键
+        return b''.join((
+            b'\x84', msgpack.packb('id'), msgpack.packb(response_id), msgpack.packb('result'), raw_result,
+            msgpack.packb('error'), msgpack.packb(None), msgpack.packb('etag'), msgpack.packb(etag),
+        ))
+
+    def decode_lazy(self, data: bytes) -> Any:
+        if _is_msgpack_map(data):
+            return LazyMsgpackMap(data)
+        return self.decode(data)
+
+
+def _unpacker(data: bytes) -> 'msgpack.Unpacker':
+    import msgpack
+
+    unpacker = msgpack.Unpacker(raw=False, max_buffer_size=len(data))
+    unpacker.feed(data)
+    return unpacker
+
+
+def _is_msgpack_map(data: bytes) -> bool:
+    # fixmap: 0x80-0x8f, map16: 0xde, map32: 0xdf
+    return bool(data) and (0x80 <= data[0] <= 0x8f or data[0] in (0xde, 0xdf))
+
+
+class LazyMsgpackMap(Mapping):
+    """
+    按需解码的 msgpack map。构造时只解码键并记录每个值在原始字节中的偏移量，
+    访问某个键时才解码对应的值，嵌套的 map 同样按需解码。
+    """
+
+    __slots__ = ('_data', '_offsets', '_cache')
+
+    def __init__(self, data: bytes):
+        self._data = data
+        self._offsets: Dict[Any, Tuple[int, int]] = {}
+        self._cache: Dict[Any, Any] = {}
+        unpacker = _unpacker(data)
+        for _ in range(unpacker.read_map_header()):
+            key = unpacker.unpack()
+            start = unpacker.tell()
+            unpacker.skip()
+            self._offsets[key] = (start, unpacker.tell())
+
+    def __getitem__(self, key: Any) -> Any:
+        if key in self._cache:
+            return self._cache[key]
+        start, end = self._offsets[key]
+        raw = self._data[start:end]
+        if _is_msgpack_map(raw):
+            value = LazyMsgpackMap(raw)
+        else:
+            import msgpack
+
+            value = msgpack.unpackb(raw, raw=False)
+        self._cache[key] = value
+        return value
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
 
 message_management: dict[str, Message] = {
     "json": JsonMessage(),
@@ -0,0 +1,148 @@
+import asyncio
+import importlib
+import math
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from .capture import SERVER_TIME_HEADER, TIMING_HEADER, read_capture
+from .client import RpcClient
+from .message import JsonMessage, message_management
+
+
+def load_app(app_path: str) -> Any:
+    """导入 `module:attribute` 形式的 ASGI 应用，当前目录会被加入 `sys.path`。"""
+    module_name, _, attribute = app_path.partition(':')
+    if not module_name or not attribute:
+        raise ValueError(f"krpc app path must be in 'module:attribute' format, got '{app_path}'")
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+    value = importlib.import_module(module_name)
+    for name in attribute.split('.'):
+        value = getattr(value, name)
+    return value
+
+
+def load_capture(path: str) -> List[Dict[str, Any]]:
+    """读取采集日志，按请求时间排序，并从请求体中解析出方法名（`method` 字段）。"""
+    records = []
+    for record in read_capture(path):
+        message = message_management.get(record['type'] or '') or JsonMessage()
+        try:
+            record['method'] = str(message.decode(record['body'])['method'])
+        except Exception as _:
+            record['method'] = '<invalid>'
+        records.append(record)
+    records.sort(key=lambda record: record['time'])
+    return records
+
+
+def percentile(values: List[float], q: float) -> float:
+    """返回已排序列表的第 q 百分位数（最近秩法）。"""
+    if not values:
+        return 0.0
+    return values[min(len(values), max(1, math.ceil(q / 100 * len(values)))) - 1]
+
+
+def summarize(samples: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    根据每个方法的耗时生成报告，耗时单位为毫秒。
+
+    `recorded` 是采集时的服务端处理耗时，`replayed` 是回放时服务端通过 `X-Krpc-Server-Time` 返回的处理耗时，
+    `p50_change` 只比较这两者；`roundtrip` 是回放时客户端测得的往返耗时（包含 HTTP 和网络），仅供参考。
+    回放目标不返回处理耗时时，`replayed` 和 `p50_change` 为 None。
+    """
+    report = {}
+    for method, sample in sorted(samples.items()):
+        row = {'count': len(sample['roundtrip']), 'errors': sample['errors']}
+        for name in ('recorded', 'replayed', 'roundtrip'):
+            values = sorted(sample[name])
+            row[f'{name}_p50'] = percentile(values, 50) * 1000 if values else None
+            row[f'{name}_p99'] = percentile(values, 99) * 1000 if values else None
+        complete = len(sample['replayed']) == len(sample['recorded'])
+        if complete and row['recorded_p50']:
+            row['p50_change'] = row['replayed_p50'] / row['recorded_p50'] - 1
+        else:
+            row['p50_change'] = None
+        report[method] = row
+    return report
+
+
+def _format_pair(p50: Optional[float], p99: Optional[float]) -> str:
+    if p50 is None:
+        return f"{'-':>10}/{'-':<11}"
+    return f"{p50:>10.3f}/{p99:<11.3f}"
+
+
+def format_report(report: Dict[str, Dict[str, Any]]) -> str:
+    lines = [
+        f"{'method':<24} {'count':>7} {'errors':>6} {'recorded p50/p99 ms':>22} {'replayed p50/p99 ms':>22} "
+        f"{'p50 change':>10} {'roundtrip p50/p99 ms':>22}"
+    ]
+    for method, row in report.items():
+        change = '-' if row['p50_change'] is None else f"{row['p50_change']:+.1%}"
+        lines.append(
+            f"{method:<24} {row['count']:>7} {row['errors']:>6} "
+            f"{_format_pair(row['recorded_p50'], row['recorded_p99'])} "
+            f"{_format_pair(row['replayed_p50'], row['replayed_p99'])} {change:>10} "
+            f"{_format_pair(row['roundtrip_p50'], row['roundtrip_p99'])}"
+        )
+    return '\n'.join(lines)
+
+
+async def replay(
+        records: List[Dict[str, Any]],
+        client: RpcClient,
+        speed: Optional[float] = 1.0
+) -> Dict[str, Dict[str, Any]]:
+    """
+    将采集的请求体原样发送到 `client.url`，返回 `summarize` 生成的按方法统计的报告。
+
+    :param records: `load_capture` 返回的记录。
+    :param client: 使用其异步连接发送请求的 `RpcClient`，进程内回放时可传入使用 `httpx.ASGITransport` 的客户端。
+    :param speed: 回放速度倍数，按记录的请求间隔除以该值调度请求（开环，不等待前一个请求完成）；
+                  为 None 或 0 时逐个发送，不保留请求间隔。
+    """
+    samples: Dict[str, Dict[str, Any]] = {}
+
+    async def send(record: Dict[str, Any]) -> None:
+        message = message_management.get(record['type'] or '') or JsonMessage()
+        headers = {**record['headers'], 'X-Krpc-Type': record['type'] or '', TIMING_HEADER: '1'}
+        started = time.perf_counter()
+        try:
+            response = await client.client_async.post(client.url, content=record['body'], headers=headers)
+        except Exception as _:
+            response = None
+        elapsed = time.perf_counter() - started
+        try:
+            failed = response.status_code != 200 or message.decode(response.content).get('error') is not None
+        except Exception as _:
+            failed = True
+        sample = samples.setdefault(
+            record['method'], {'recorded': [], 'replayed': [], 'roundtrip': [], 'errors': 0}
+        )
+        sample['recorded'].append(record['seconds'])
+        sample['roundtrip'].append(elapsed)
+        sample['errors'] += failed
+        server_time = response.headers.get(SERVER_TIME_HEADER) if response is not None else None
+        if server_time is not None:
+            sample['replayed'].append(float(server_time))
+
+    if not records:
+        return {}
+    if not speed:
+        for record in records:
+            await send(record)
+        return summarize(samples)
+
+    tasks = []
+    first = records[0]['time']
+    start = time.perf_counter()
+    for record in records:
+        delay = (record['time'] - first) / speed - (time.perf_counter() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(record)))
+    await asyncio.gather(*tasks)
+    return summarize(samples)
@@ -0,0 +1,354 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import stat
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+
+def _import_uvicorn():
+    try:
+        import uvicorn
+    except ImportError as e:  # pragma: no cover - 依赖缺失时提示安装
+        raise ImportError(
+            "krpc server runner requires 'uvicorn', install it with `pip install uvicorn`"
+        ) from e
+    return uvicorn
+
+
+def _remove_stale_socket(path: str) -> None:
+    """删除上次进程遗留的 Unix 套接字文件，避免 bind 时报 `Address already in use`。"""
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"krpc refusing to replace non-socket file: {path}")
+    os.unlink(path)
+
+
+def unix_server(app: Any, path: str, shm_threshold: Optional[int] = 256 * 1024, **kwargs) -> Any:
+    """
+    创建一个监听 Unix 域套接字的 uvicorn 服务实例（不启动）。
+
+    :param app: 包含 `Entrypoint` 的 ASGI 应用。
+    :param path: Unix 域套接字文件路径。
+    :param shm_threshold: 不小于该字节数的响应体通过共享内存段交给客户端（见 `krpc.shm`），为 None 时不使用共享内存。
+    :param kwargs: 透传给 `uvicorn.Config` 的其他参数。
+    :return: `uvicorn.Server` 实例，可通过 `run()` 或 `serve()` 启动。
+    """
+    uvicorn = _import_uvicorn()
+    _remove_stale_socket(path)
+    if shm_threshold is not None:
+        from .shm import SharedMemoryMiddleware, sweep_segments
+
+        # 清理上次进程异常退出时遗留、未被读取的共享内存段
+        sweep_segments()
+        app = SharedMemoryMiddleware(app, threshold=shm_threshold)
+    config = uvicorn.Config(app, uds=path, **kwargs)
+    return uvicorn.Server(config)
+
+
+def run_unix(app: Any, path: str, shm_threshold: Optional[int] = 256 * 1024, **kwargs) -> None:
+    """
+    在 Unix 域套接字上运行 ASGI 应用，用于同一主机上的进程间调用，
+    避免经过回环 TCP 协议栈。客户端使用 `RpcClient(url, uds=path)` 连接。
+    较大的响应体写入内存映射的共享内存段，只通过套接字传递段路径，客户端直接从映射内存解码；
+    共享内存只应对受信任的本机客户端开放，套接字位于反向代理之后时，
+    应关闭共享内存（`shm_threshold=None`）或由代理去掉 `X-Krpc-Shm` 请求头。
+
+    :param app: 包含 `Entrypoint` 的 ASGI 应用。
+    :param path: Unix 域套接字文件路径。
+    :param shm_threshold: 使用共享内存传递的最小响应体字节数，为 None 时不使用共享内存。
+    :param kwargs: 透传给 `uvicorn.Config` 的其他参数。
+    """
+    unix_server(app, path, shm_threshold=shm_threshold, **kwargs).run()
+
+
+def reuse_port_socket(host: str, port: int) -> socket.socket:
+    """
+    创建开启 `SO_REUSEPORT` 的 TCP 套接字，只绑定不监听。
+    uvicorn 在 lifespan 启动完成后才调用 `listen()`，因此内核不会把连接分配给尚未预热完成的 worker。
+    """
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise RuntimeError("krpc multi-worker server requires SO_REUSEPORT support")
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def find_entrypoints(app: Any) -> list:
+    """在 ASGI 应用中查找所有 `Entrypoint`（包括通过 `include_router` 和 `mount` 注册的）。"""
+    from .asgi import RpcASGIApp
+    from .core import Entrypoint
+
+    found = []
+
+    def add(entrypoint: Entrypoint) -> None:
+        if entrypoint not in found:
+            found.append(entrypoint)
+
+    def walk(node: Any) -> None:
+        if isinstance(node, RpcASGIApp):
+            add(node.entrypoint)
+            return
+        if isinstance(node, Entrypoint):
+            add(node)
+        for route in getattr(node, 'routes', None) or []:
+            owner = getattr(getattr(route, 'endpoint', None), '__self__', None)
+            if isinstance(owner, Entrypoint):
+                add(owner)
+            # Mount 的子应用，以及新版 FastAPI `include_router` 保留的原始路由器
+            for child in (getattr(route, 'app', None), getattr(route, 'original_router', None)):
+                if child is not None and child is not node:
+                    walk(child)
+
+    walk(app)
+    return found
+
+
+def merge_stats(snapshots: Iterable[Dict[str, Dict[str, Dict[str, Any]]]]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """合并多个 worker 的 `{path: {method: {calls, errors, seconds}}}` 统计。"""
+    merged: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for snapshot in snapshots:
+        for path, methods in snapshot.items():
+            for name, stats in methods.items():
+                total = merged.setdefault(path, {}).setdefault(name, {'calls': 0, 'errors': 0, 'seconds': 0.0})
+                for key, value in stats.items():
+                    total[key] += value
+    return merged
+
+
+async def _serve_worker(server: Any, sock: socket.socket, ready: Any, entrypoints: list,
+                        stats_queue: Any, index: int, stats_interval: float) -> None:
+    task = asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started and not task.done():
+        await asyncio.sleep(0.01)
+    ready.set()
+    while not task.done():
+        await asyncio.wait({task}, timeout=stats_interval)
+        stats_queue.put((index, os.getpid(), {ep.path: ep.stats() for ep in entrypoints}))
+    await task
+
+
+def _run_worker(app_path: str, index: int, host: str, port: int, cpu: Optional[int],
+                ready: Any, stats_queue: Any, stats_interval: float, config_kwargs: Dict[str, Any]) -> None:
+    """worker 进程入口：绑定 CPU、导入应用、完成 lifespan 预热后再开始监听。"""
+    if cpu is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {cpu})
+    uvicorn = _import_uvicorn()
+    from uvicorn.importer import import_from_string
+
+    # 退出时不等待尚未被读取的统计数据写完
+    stats_queue.cancel_join_thread()
+    app = import_from_string(app_path)
+    server = uvicorn.Server(uvicorn.Config(app, **config_kwargs))
+    sock = reuse_port_socket(host, port)
+    asyncio.run(_serve_worker(server, sock, ready, find_entrypoints(app), stats_queue, index, stats_interval))
+
+
+class Supervisor:
+    """
+    多进程服务管理器。每个 worker 各自绑定同一端口的 `SO_REUSEPORT` 套接字，由内核分配连接。
+
+    - `SIGHUP`：滚动重启，逐个启动新 worker，待其预热完成开始监听后再优雅关闭对应的旧 worker；
+      新 worker 启动失败时保留旧 worker 并中止重启；
+    - `SIGUSR1`：输出所有 worker 合并后的调用统计；
+    - `SIGINT`/`SIGTERM`：优雅关闭所有 worker。
+
+    worker 使用 spawn 方式启动并自行导入应用，因此滚动重启会加载新的代码。
+    """
+
+    def __init__(
+            self,
+            app_path: str,
+            host: str = '127.0.0.1',
+            port: int = 8000,
+            workers: Optional[int] = None,
+            pin_cpus: bool = False,
+            stats_interval: float = 5.0,
+            stats_file: Optional[str] = None,
+            ready_timeout: float = 30.0,
+            max_backoff: float = 30.0,
+            **config_kwargs,
+    ):
+        """
+        :param app_path: `module:attribute` 形式的应用路径。
+        :param host: 监听地址。
+        :param port: 监听端口。
+        :param workers: worker 数量，默认为可用 CPU 数量。
+        :param pin_cpus: 是否将每个 worker 绑定到一个 CPU 核心。
+        :param stats_interval: worker 上报调用统计的间隔（秒）。
+        :param stats_file: （可选）定期写入合并后统计的 JSON 文件路径。
+        :param ready_timeout: 等待 worker 预热完成的超时时间（秒）。
+        :param max_backoff: 异常退出的 worker 重启失败时，重试间隔的上限（秒），间隔从 0.5 秒开始逐次翻倍。
+        :param config_kwargs: 透传给 `uvicorn.Config` 的其他参数。
+        """
+        self.app_path = app_path
+        self.host = host
+        self.port = port
+        self.cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(
+            range(os.cpu_count() or 1))
+        self.workers_count = workers or len(self.cpus)
+        self.pin_cpus = pin_cpus
+        self.stats_interval = stats_interval
+        self.stats_file = stats_file
+        self.ready_timeout = ready_timeout
+        self.max_backoff = max_backoff
+        self.config_kwargs = config_kwargs
+        self.logger = logging.getLogger('krpc.server')
+        self.context = multiprocessing.get_context('spawn')
+        self.stats_queue = self.context.Queue()
+        self.workers: Dict[int, multiprocessing.Process] = {}
+        self.worker_stats: Dict[int, Dict[str, Any]] = {}
+        # worker 重启失败后的重试间隔和下次重试时间
+        self._backoff: Dict[int, float] = {}
+        self._respawn_at: Dict[int, float] = {}
+        self._should_exit = threading.Event()
+        self._should_restart = threading.Event()
+        self._should_report = threading.Event()
+
+    def spawn(self, index: int) -> multiprocessing.Process:
+        cpu = self.cpus[index % len(self.cpus)] if self.pin_cpus else None
+        ready = self.context.Event()
+        process = self.context.Process(
+            target=_run_worker,
+            args=(self.app_path, index, self.host, self.port, cpu, ready,
+                  self.stats_queue, self.stats_interval, self.config_kwargs),
+            name=f'krpc-worker-{index}',
+            daemon=True,
+        )
+        process.start()
+        if not self.wait_ready(process, ready):
+            process.terminate()
+            process.join()
+            raise RuntimeError(f"krpc worker {index} failed to start")
+        self.logger.info(f"krpc worker {index} started [pid {process.pid}]")
+        return process
+
+    def wait_ready(self, process: multiprocessing.Process, ready: Any) -> bool:
+        """
+        分段等待 worker 预热完成。worker 在导入应用或 bind 时退出、超过 `ready_timeout`
+        或收到退出信号时立即返回 False，不让 supervisor 循环阻塞整个超时时间。
+        """
+        deadline = time.monotonic() + self.ready_timeout
+        while not ready.wait(0.1):
+            if not process.is_alive() or self._should_exit.is_set() or time.monotonic() >= deadline:
+                return False
+        return process.is_alive()
+
+    def stop_worker(self, process: multiprocessing.Process, timeout: float = 30.0) -> None:
+        process.terminate()
+        process.join(timeout)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        self.worker_stats.pop(process.pid, None)
+
+    def rolling_restart(self) -> bool:
+        """逐个替换 worker。新 worker 启动失败时保留对应的旧 worker 并中止重启，返回是否全部替换完成。"""
+        for index in sorted(self.workers):
+            old = self.workers[index]
+            try:
+                new = self.spawn(index)
+            except RuntimeError as e:
+                self.logger.error(f"{e}, rolling restart aborted, keeping the running workers")
+                return False
+            self.workers[index] = new
+            self.stop_worker(old)
+        self.logger.info("krpc rolling restart complete")
+        return True
+
+    def respawn(self, index: int) -> None:
+        """重新拉起异常退出的 worker，失败时按指数退避稍后重试，不影响其他 worker。"""
+        if time.monotonic() < self._respawn_at.get(index, 0.0):
+            return
+        process = self.workers[index]
+        self.worker_stats.pop(process.pid, None)
+        if index not in self._backoff:
+            self.logger.warning(f"krpc worker {index} exited with code {process.exitcode}")
+        try:
+            self.workers[index] = self.spawn(index)
+        except RuntimeError as e:
+            delay = min(self.max_backoff, self._backoff.get(index, 0.25) * 2)
+            self._backoff[index] = delay
+            self._respawn_at[index] = time.monotonic() + delay
+            self.logger.error(f"{e}, retrying in {delay:.1f}s")
+            return
+        self._backoff.pop(index, None)
+        self._respawn_at.pop(index, None)
+
+    def collect_stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """读取 worker 上报的统计并返回合并结果。"""
+        while True:
+            try:
+                _, pid, snapshot = self.stats_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.worker_stats[pid] = snapshot
+        return merge_stats(self.worker_stats.values())
+
+    def request_restart(self) -> None:
+        self._should_restart.set()
+
+    def request_stop(self) -> None:
+        self._should_exit.set()
+
+    def install_signal_handlers(self) -> None:
+        signal.signal(signal.SIGINT, lambda *_: self._should_exit.set())
+        signal.signal(signal.SIGTERM, lambda *_: self._should_exit.set())
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda *_: self._should_restart.set())
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda *_: self._should_report.set())
+
+    def run(self, install_signals: bool = True) -> None:
+        if install_signals:
+            self.install_signal_handlers()
+        try:
+            for index in range(self.workers_count):
+                try:
+                    self.workers[index] = self.spawn(index)
+                except RuntimeError:
+                    if self._should_exit.is_set():
+                        return
+                    raise
+            self.logger.info(
+                f"krpc serving {self.app_path} on {self.host}:{self.port} with {self.workers_count} workers"
+            )
+            while not self._should_exit.wait(0.5):
+                if self._should_restart.is_set():
+                    self._should_restart.clear()
+                    self.rolling_restart()
+                for index, process in list(self.workers.items()):
+                    # worker 异常退出时重新拉起
+                    if not process.is_alive() and not self._should_exit.is_set():
+                        self.respawn(index)
+                stats = self.collect_stats()
+                if self._should_report.is_set():
+                    self._should_report.clear()
+                    self.logger.info(f"krpc stats {json.dumps(stats)}")
+                if self.stats_file:
+                    with open(self.stats_file, 'w') as f:
+                        json.dump(stats, f)
+        finally:
+            for process in self.workers.values():
+                process.terminate()
+            for process in self.workers.values():
+                self.stop_worker(process)
+            self.workers.clear()
+
+
+def serve(app_path: str, **kwargs) -> None:
+    """以多 worker 方式运行 `module:attribute` 指定的应用，参数见 `Supervisor`。"""
+    Supervisor(app_path, **kwargs).run()
@@ -0,0 +1,187 @@
+import asyncio
+import mmap
+import os
+import stat
+import tempfile
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+# 请求头：客户端与服务端位于同一主机，可以通过共享内存段接收响应
+SHM_HEADER = 'X-Krpc-Shm'
+# 响应头：承载响应体的共享内存段路径和字节数
+SHM_SEGMENT_HEADER = 'X-Krpc-Shm-Segment'
+SHM_SIZE_HEADER = 'X-Krpc-Shm-Size'
+# `httpx.Response.extensions` 中保存共享内存段视图的键
+SHM_EXTENSION = 'krpc_shm'
+SEGMENT_PREFIX = 'krpc-shm-'
+
+
+def default_directory() -> str:
+    """共享内存段所在目录，优先使用内存文件系统 `/dev/shm`。"""
+    return '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+def write_segment(data: bytes, directory: Optional[str] = None) -> str:
+    """创建仅当前用户可读写的内存映射段并写入数据，返回段文件路径。段由读取方在映射后删除。"""
+    path = os.path.join(directory or default_directory(), f'{SEGMENT_PREFIX}{uuid.uuid4().hex}')
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        os.ftruncate(fd, len(data))
+        with mmap.mmap(fd, len(data)) as segment:
+            segment[:] = data
+    except BaseException:
+        os.unlink(path)
+        raise
+    finally:
+        os.close(fd)
+    return path
+
+
+def read_segment(path: str, size: int) -> memoryview:
+    """
+    以只读方式映射共享内存段并删除段文件，返回映射内存的视图，不复制数据。
+    映射在视图（及由其切出的视图）全部释放后自动解除。
+    """
+    if not os.path.basename(path).startswith(SEGMENT_PREFIX):
+        raise ValueError(f"krpc refusing to map non-segment file: {path}")
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            if os.fstat(fd).st_size != size:
+                raise ValueError(f"krpc shared memory segment size mismatch: {path}")
+            segment = mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+    finally:
+        os.unlink(path)
+    return memoryview(segment)
+
+
+def remove_segment(path: str) -> None:
+    """删除共享内存段，段已被读取方删除时忽略。"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def sweep_segments(directory: Optional[str] = None, max_age: float = 60.0) -> int:
+    """
+    删除目录中当前用户创建、超过 `max_age` 秒仍未被读取的共享内存段，返回删除的数量。
+    用于清理服务端进程异常退出时遗留的段。
+    """
+    deadline = time.time() - max_age
+    removed = 0
+    with os.scandir(directory or default_directory()) as entries:
+        for entry in entries:
+            if not entry.name.startswith(SEGMENT_PREFIX):
+                continue
+            try:
+                info = entry.stat(follow_symlinks=False)
+                if stat.S_ISREG(info.st_mode) and info.st_uid == os.getuid() and info.st_mtime < deadline:
+                    os.unlink(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+    return removed
+
+
+def response_content(response: httpx.Response) -> Any:
+    """返回响应体：通过共享内存传递时为映射内存的视图，否则为 `response.content`。"""
+    content = response.extensions.get(SHM_EXTENSION)
+    return response.content if content is None else content
+
+
+def _attach_segment(response: httpx.Response) -> httpx.Response:
+    path = response.headers.get(SHM_SEGMENT_HEADER)
+    if path is not None:
+        response.extensions[SHM_EXTENSION] = read_segment(path, int(response.headers[SHM_SIZE_HEADER]))
+    return response
+
+
+class SharedMemoryTransport(httpx.HTTPTransport):
+    """
+    同一主机上使用的同步传输（通常配合 `uds`）。请求时声明可以接收共享内存段，
+    服务端通过 `SharedMemoryMiddleware` 将较大的响应体写入内存映射段后，只在响应头中返回段路径，
+    响应体不再经过套接字；`RpcClient` 直接从映射内存解码。
+    """
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.headers[SHM_HEADER] = '1'
+        return _attach_segment(super().handle_request(request))
+
+
+class AsyncSharedMemoryTransport(httpx.AsyncHTTPTransport):
+    """`SharedMemoryTransport` 的异步版本。"""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.headers[SHM_HEADER] = '1'
+        return _attach_segment(await super().handle_async_request(request))
+
+
+class SharedMemoryMiddleware:
+    """
+    ASGI 中间件：请求携带 `X-Krpc-Shm` 且响应体不小于 `threshold` 字节时，
+    将响应体写入共享内存段，以空响应体和段路径响应头代替。流式响应（如订阅）不受影响。
+    段由客户端读取时删除；客户端超时、崩溃或不读取时，服务端在 `ttl` 秒后删除。
+
+    仅适用于客户端与服务端位于同一主机的部署，例如 `krpc.server.run_unix`。
+    `X-Krpc-Shm` 只应来自受信任的本机客户端：套接字位于反向代理之后时，代理必须去掉该请求头，
+    否则远程请求也会让服务端在内存文件系统中写入段文件。
+    """
+
+    def __init__(self, app: Any, threshold: int = 256 * 1024, directory: Optional[str] = None,
+                 ttl: float = 10.0):
+        """
+        :param app: 被包装的 ASGI 应用。
+        :param threshold: 使用共享内存传递的最小响应体字节数。
+        :param directory: 共享内存段所在目录，默认为 `/dev/shm`。
+        :param ttl: 响应发出后段的保留时间（秒），超时仍未被客户端读取的段由服务端删除。
+        """
+        self.app = app
+        self.threshold = threshold
+        self.directory = directory
+        self.ttl = ttl
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope['type'] != 'http' or not any(name == b'x-krpc-shm' for name, _ in scope['headers']):
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Dict[str, Any]] = None
+
+        async def send_segment(event: Dict[str, Any]) -> None:
+            nonlocal start
+            if event['type'] == 'http.response.start':
+                start = event
+                return
+            if start is not None:
+                body = event.get('body', b'')
+                if event['type'] == 'http.response.body' and not event.get('more_body', False) \
+                        and len(body) >= self.threshold:
+                    path = write_segment(body, self.directory)
+                    headers = [(name, value) for name, value in start.get('headers', [])
+                               if name.lower() != b'content-length']
+                    headers += [
+                        (b'content-length', b'0'),
+                        (SHM_SEGMENT_HEADER.lower().encode('latin-1'), path.encode('latin-1')),
+                        (SHM_SIZE_HEADER.lower().encode('latin-1'), str(len(body)).encode('latin-1')),
+                    ]
+                    try:
+                        await send({**start, 'headers': headers})
+                        await send({'type': 'http.response.body', 'body': b''})
+                    except BaseException:
+                        # 客户端没有收到段路径，由服务端删除
+                        remove_segment(path)
+                        raise
+                    asyncio.get_running_loop().call_later(self.ttl, remove_segment, path)
+                    start = None
+                    return
+                await send(start)
+                start = None
+            await send(event)
+
+        await self.app(scope, receive, send_segment)
@@ -0,0 +1,228 @@
+import asyncio
+import json
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from .errors import RpcException, RpcErrorCode
+from .message import Message, encode_frame
+from .method import ParamsError, RpcMethod
+from .models import RpcRequestModel
+
+if TYPE_CHECKING:
+    from starlette.requests import Request
+
+    from .depends import Resources
+
+# 慢消费者策略：队列已满时
+DROP_OLDEST = 'drop_oldest'  # 丢弃最早未发送的事件
+DROP_NEWEST = 'drop_newest'  # 丢弃新事件
+BLOCK = 'block'  # 等待消费者（生产者随之减速，影响同一主题的所有订阅者）
+DISCONNECT = 'disconnect'  # 断开该订阅者
+POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK, DISCONNECT)
+
+_END = object()
+
+
+class Event:
+    """一次推送的事件。同一事件按编码类型只编码一次，供所有订阅者共享。"""
+
+    __slots__ = ('result', 'error', '_frames')
+
+    def __init__(self, result: Any = None, error: Optional[Dict[str, Any]] = None):
+        self.result = result
+        self.error = error
+        self._frames: Dict[Optional[str], bytes] = {}
+
+    def frame(self, message: Message) -> bytes:
+        frame = self._frames.get(message.rpc_media_type)
+        if frame is None:
+            payload = message.encode({'result': message.to_jsonable(self.result), 'error': self.error})
+            frame = self._frames[message.rpc_media_type] = encode_frame(payload)
+        return frame
+
+
+class Subscriber:
+    """单个订阅连接，持有有界队列，按策略处理跟不上推送速度的情况。"""
+
+    def __init__(self, queue_size: int = 100, policy: str = DROP_OLDEST):
+        # 队列本身不限长度，以便结束标记总能放入；长度限制由 `put` 按策略执行
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.queue_size = queue_size
+        self.policy = policy
+        self.dropped = 0
+        self.closed = False
+        self._space = asyncio.Event()
+
+    def full(self) -> bool:
+        return self.queue.qsize() >= self.queue_size
+
+    async def put(self, event: Event) -> None:
+        if self.policy == BLOCK:
+            while self.full() and not self.closed:
+                self._space.clear()
+                await self._space.wait()
+        if self.closed:
+            return
+        if self.full():
+            self.dropped += 1
+            if self.policy == DROP_NEWEST:
+                return
+            if self.policy == DISCONNECT:
+                self.close()
+                return
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    def close(self) -> None:
+        """立即结束订阅，已在队列中的事件会被丢弃。"""
+        if self.closed:
+            return
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.finish()
+
+    def finish(self) -> None:
+        """生产者结束：发送完队列中剩余的事件后结束订阅。"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put_nowait(_END)
+        self._space.set()
+
+    async def __aiter__(self) -> AsyncIterator[Event]:
+        while True:
+            event = await self.queue.get()
+            self._space.set()
+            if event is _END:
+                return
+            yield event
+
+
+class SubscriptionMethod(RpcMethod):
+    """通过 `Entrypoint.subscribe` 注册的订阅方法，处理函数是一个异步生成器。"""
+
+    def __init__(self, endpoint: Callable, queue_size: int = 100, policy: str = DROP_OLDEST,
+                 shared: Optional[bool] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"krpc unknown subscription policy '{policy}', expected one of {POLICIES}")
+        super().__init__(endpoint)
+        self.queue_size = queue_size
+        self.policy = policy
+        # 依赖 `Request` 或 `Depends` 的生产者可能按请求产生不同的事件，默认不共享
+        self.shared = not self.has_dependencies if shared is None else shared
+
+
+class Topic:
+    """同一方法、同一参数的订阅共享一个生产者，事件扇出到所有订阅者。"""
+
+    def __init__(self, broadcaster: 'Broadcaster', key: Optional[Tuple], method: SubscriptionMethod,
+                 kwargs: Dict[str, Any], resources: Optional['Resources'], request: Optional['Request']):
+        self.broadcaster = broadcaster
+        self.key = key
+        self.method = method
+        self.kwargs = kwargs
+        self.resources = resources
+        self.request = request
+        self.subscribers: List[Subscriber] = []
+        self.task: Optional[asyncio.Task] = None
+
+    def add(self, subscriber: Subscriber) -> None:
+        self.subscribers.append(subscriber)
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def remove(self, subscriber: Subscriber) -> None:
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+        if not self.subscribers:
+            self.detach()
+            if self.task is not None and not self.task.done():
+                self.task.cancel()
+
+    def detach(self) -> None:
+        """从 `Broadcaster` 中移除，之后相同的订阅会创建新的主题。"""
+        if self.key is not None and self.broadcaster.topics.get(self.key) is self:
+            del self.broadcaster.topics[self.key]
+
+    async def publish(self, event: Event) -> None:
+        for subscriber in list(self.subscribers):
+            await subscriber.put(event)
+
+    async def run(self) -> None:
+        from .depends import DependencyScope
+
+        scope = DependencyScope(self.resources, self.request)
+        generator = None
+        try:
+            kwargs = dict(self.kwargs)
+            if self.method.has_dependencies:
+                kwargs.update(await scope.solve_kwargs(self.method.endpoint))
+            generator = self.method.endpoint(**kwargs)
+            async for value in generator:
+                await self.publish(Event(result=value))
+        except asyncio.CancelledError:
+            raise
+        except Exception as _:
+            await self.publish(Event(error=RpcException.parse(RpcErrorCode.INTERNAL_ERROR)))
+        finally:
+            self.detach()
+            for subscriber in self.subscribers:
+                subscriber.finish()
+            if generator is not None:
+                await generator.aclose()
+            await scope.close()
+
+
+class Broadcaster:
+    """管理一个 `Entrypoint` 的所有订阅主题。"""
+
+    def __init__(self) -> None:
+        self.topics: Dict[Tuple, Topic] = {}
+
+    def subscribe(self, method: SubscriptionMethod, params: Dict[str, Any], kwargs: Dict[str, Any],
+                  resources: Optional['Resources'] = None, request: Optional['Request'] = None) -> Tuple[Topic, Subscriber]:
+        if not method.shared:
+            topic = Topic(self, None, method, kwargs, resources, request)
+        else:
+            key = (method.name, json.dumps(params, sort_keys=True, default=str))
+            topic = self.topics.get(key)
+            if topic is None:
+                topic = self.topics[key] = Topic(self, key, method, kwargs, resources, request)
+        subscriber = Subscriber(method.queue_size, method.policy)
+        topic.add(subscriber)
+        return topic, subscriber
+
+
+async def stream_events(
+        message: Message,
+        body: bytes,
+        methods: Dict[str, SubscriptionMethod],
+        broadcaster: Broadcaster,
+        resources: Optional['Resources'] = None,
+        request: Optional['Request'] = None
+) -> AsyncIterator[bytes]:
+    """
+    处理订阅请求，逐帧产出编码后的事件。请求无效时只产出一个错误帧。
+    迭代器被关闭（客户端断开）时自动取消订阅，最后一个订阅者离开时停止生产者。
+    """
+    try:
+        req = RpcRequestModel(**message.decode(body))
+    except Exception as _:
+        yield Event(error=RpcException.parse(RpcErrorCode.PARSE_ERROR)).frame(message)
+        return
+
+    method = methods.get(req.method)
+    if method is None:
+        yield Event(error=RpcException.parse(RpcErrorCode.METHOD_NOT_FOUND)).frame(message)
+        return
+    try:
+        kwargs = method.validate(req.params)
+    except ParamsError as e:
+        yield Event(error=RpcException.parse(RpcErrorCode.INVALID_PARAMS, e.errors)).frame(message)
+        return
+
+    topic, subscriber = broadcaster.subscribe(method, req.params, kwargs, resources, request)
+    try:
+        async for event in subscriber:
+            yield event.frame(message)
+    finally:
+        topic.remove(subscriber)
@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI
+
+from krpc import Entrypoint
+
+
+def build_entrypoint() -> Entrypoint:
+    api_v1 = Entrypoint('/api/v1/jsonrpc')
+
+    @api_v1.method
+    async def add(a: int, b: int) -> int:
+        return a + b
+
+    return api_v1
+
+
+async def drive(app, path: str, body: bytes, requests: int) -> float:
+    """
+    直接调用 ASGI 应用（不经过网络和 HTTP 客户端），返回每个请求的平均耗时（微秒）。
+    """
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'POST',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': b'',
+        'headers': [(b'content-type', b'json'), (b'x-krpc-type', b'json')],
+        'client': ('127.0.0.1', 0),
+        'server': ('127.0.0.1', 8000),
+    }
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(_):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+async def main(requests: int) -> None:
+    body = json.dumps({'id': 1, 'method': 'add', 'params': {'a': 1, 'b': 2}}).encode()
+
+    api_v1 = build_entrypoint()
+    app = FastAPI()
+    app.include_router(api_v1)
+
+    # 预热，避免首次调用的初始化开销影响结果
+    await drive(app, api_v1.path, body, 100)
+    await drive(api_v1.asgi_app(), api_v1.path, body, 100)
+
+    fastapi_us = await drive(app, api_v1.path, body, requests)
+    asgi_us = await drive(api_v1.asgi_app(), api_v1.path, body, requests)
+    print(f"FastAPI route : {fastapi_us:8.1f} us/request")
+    print(f"RpcASGIApp    : {asgi_us:8.1f} us/request")
+    print(f"framework overhead removed: {fastapi_us - asgi_us:.1f} us/request ({fastapi_us / asgi_us:.2f}x)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='比较 FastAPI 路由与纯 ASGI 入口的单请求开销')
+    parser.add_argument('-n', '--requests', type=int, default=20000)
+    asyncio.run(main(parser.parse_args().requests))
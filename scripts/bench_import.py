@@ -0,0 +1,33 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+CASES = {
+    'client': 'from krpc import RpcClient',
+    'server': 'from krpc import Entrypoint',
+}
+
+
+def measure(code: str, repeat: int) -> float:
+    """
+    在新的解释器进程中统计导入耗时（毫秒），取多次运行的中位数。
+    """
+    project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = f"import time\nstart = time.perf_counter()\n{code}\nprint(time.perf_counter() - start)"
+    env = {**os.environ, 'PYTHONPATH': project_path}
+    samples = [
+        float(subprocess.run([sys.executable, '-c', script], check=True, capture_output=True, text=True,
+                             env=env).stdout) * 1000
+        for _ in range(repeat)
+    ]
+    return statistics.median(samples)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='统计仅客户端导入与服务端导入的耗时')
+    parser.add_argument('-n', '--repeat', type=int, default=10)
+    repeat = parser.parse_args().repeat
+    for name, code in CASES.items():
+        print(f"{name:8}: {measure(code, repeat):7.1f} ms  ({code})")
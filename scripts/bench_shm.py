@@ -0,0 +1,63 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from fastapi import FastAPI
+
+from krpc import Entrypoint, RpcClient
+from krpc.server import unix_server
+
+
+def build_app(megabytes: int) -> FastAPI:
+    api_v1 = Entrypoint('/api/v1/jsonrpc')
+    # 编码开销很小的大结果，使耗时主要来自传输
+    payload = ['x' * 1024 * 1024] * megabytes
+
+    @api_v1.method
+    async def rows() -> list:
+        return payload
+
+    app = FastAPI()
+    app.include_router(api_v1)
+    return app
+
+
+def start(app: FastAPI, path: str, shm_threshold) -> object:
+    server = unix_server(app, path, shm_threshold=shm_threshold, log_level='warning', lifespan='off')
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def measure(path: str, calls: int) -> float:
+    """返回每次调用的平均耗时（毫秒）。"""
+    client = RpcClient('http://localhost/api/v1/jsonrpc', rpc_media_type='msgpack', uds=path)
+    client.call('rows')
+    started = time.perf_counter()
+    for _ in range(calls):
+        assert client.call('rows')['error'] is None
+    return (time.perf_counter() - started) / calls * 1000
+
+
+def main(megabytes: int, calls: int) -> None:
+    app = build_app(megabytes)
+    directory = tempfile.mkdtemp()
+    results = {}
+    for name, threshold in (('unix socket', None), ('shared memory', 64 * 1024)):
+        path = os.path.join(directory, f'{name.replace(" ", "-")}.sock')
+        server = start(app, path, threshold)
+        results[name] = measure(path, calls)
+        server.should_exit = True
+    for name, ms in results.items():
+        print(f"{name:<14}: {ms:8.1f} ms/call")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='比较大型 msgpack 结果经 Unix 套接字和共享内存段传递的耗时')
+    parser.add_argument('--mb', type=int, default=32, help='结果大小（MB）')
+    parser.add_argument('-n', '--calls', type=int, default=20)
+    args = parser.parse_args()
+    main(args.mb, args.calls)
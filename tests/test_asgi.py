@@ -0,0 +1,97 @@
+from typing import Any
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI, Request
+from httpx import ASGITransport
+from pydantic import BaseModel
+
+from krpc import Entrypoint, RpcClient, RpcErrorCode
+
+service_url = '/api/v1/rpc'
+
+
+class OperationParams(BaseModel):
+    a: int
+    b: int
+
+
+@pytest.fixture
+def entrypoint() -> Entrypoint:
+    api_v1 = Entrypoint(service_url, include_method_routes=False)
+
+    @api_v1.resource
+    async def offset():
+        yield 10
+
+    @api_v1.method
+    async def add(params: OperationParams, offset=Depends(offset)) -> int:
+        return params.a + params.b + offset
+
+    return api_v1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('rpc_media_type', ['json', 'msgpack'])
+async def test_asgi_app(entrypoint: Entrypoint, rpc_media_type: str):
+    transport = ASGITransport(app=entrypoint.asgi_app())
+    client = RpcClient(url='http://test/', rpc_media_type=rpc_media_type, transport=transport)
+    data = await client.call_async('add', {'params': {'a': 1, 'b': 2}})
+    assert data['result'] == 13
+
+    client = RpcClient(url='http://test/', rpc_media_type=rpc_media_type, transport=transport)
+    data = await client.call_async('multiply', {'params': {'a': 1, 'b': 2}})
+    assert data['error']['code'] == RpcErrorCode.METHOD_NOT_FOUND.value[0]
+
+
+@pytest.mark.asyncio
+async def test_asgi_app_mounted(entrypoint: Entrypoint):
+    app = FastAPI()
+    app.mount(service_url, entrypoint.asgi_app())
+    client = RpcClient(url='http://test' + service_url + '/', transport=ASGITransport(app=app))
+    data = await client.call_async('add', {'params': {'a': 1, 'b': 2}})
+    assert data['result'] == 13
+    # 关闭 include_method_routes 后不再注册按方法的文档路由
+    assert [route.path for route in entrypoint.routes] == [service_url]
+
+
+@pytest.mark.asyncio
+async def test_asgi_app_rejects_get(entrypoint: Entrypoint):
+    async with httpx.AsyncClient(transport=ASGITransport(app=entrypoint.asgi_app())) as client:
+        response = await client.get('http://test/')
+    assert response.status_code == 405
+
+
+@pytest.mark.asyncio
+async def test_asgi_app_lifespan(entrypoint: Entrypoint):
+    app = entrypoint.asgi_app()
+    sent: list[Any] = []
+    events = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+
+    async def receive():
+        return next(events)
+
+    async def send(event):
+        sent.append(event['type'])
+
+    await app({'type': 'lifespan'}, receive, send)
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+
+
+@pytest.mark.asyncio
+async def test_asgi_app_request_body(entrypoint: Entrypoint):
+    async def body_size(request: Request) -> int:
+        return len(await request.body())
+
+    @entrypoint.method
+    async def peek(request: Request, size=Depends(body_size)) -> dict:
+        return {'size': size, 'method': (await request.json())['method']}
+
+    app = FastAPI()
+    app.include_router(entrypoint)
+    for transport in (ASGITransport(app=app), ASGITransport(app=entrypoint.asgi_app())):
+        client = RpcClient(url='http://test' + service_url, transport=transport)
+        data = await client.call_async('peek')
+        assert data['error'] is None
+        assert data['result']['size'] > 0
+        assert data['result']['method'] == 'peek'
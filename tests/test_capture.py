@@ -0,0 +1,140 @@
+import asyncio
+import json
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport
+
+from krpc import Entrypoint, RpcClient
+from krpc.capture import SERVER_TIME_HEADER, TIMING_HEADER, TrafficRecorder, read_capture
+from krpc.cli import main
+from krpc.replay import load_capture, percentile, replay
+
+service_url = '/api/v1/rpc'
+test_url = 'http://test' + service_url
+
+app = FastAPI()
+api_v1 = Entrypoint(service_url)
+
+
+@api_v1.method
+async def add(a: int, b: int) -> int:
+    return a + b
+
+
+@api_v1.method
+async def echo(text: str) -> str:
+    return text
+
+
+app.include_router(api_v1)
+
+
+@pytest.fixture
+def capture_path(tmp_path: Any) -> str:
+    return str(tmp_path / 'capture.log')
+
+
+async def record_traffic(path: str, target: Any = app, **kwargs) -> None:
+    api_v1.capture(path, **kwargs)
+    try:
+        for rpc_media_type in ('json', 'msgpack'):
+            client = RpcClient(url=test_url, rpc_media_type=rpc_media_type, transport=ASGITransport(app=target))
+            await client.call_async('add', {'a': 1, 'b': 2})
+            await client.call_async('echo', {'text': 'hi'}, columnar=True)
+            await client.call_async('add', {'a': 'x'})
+    finally:
+        api_v1.stop_capture()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('target', [app, api_v1.asgi_app()], ids=['fastapi', 'asgi'])
+async def test_capture(capture_path: str, target: Any):
+    await record_traffic(capture_path, target)
+    records = list(read_capture(capture_path))
+    assert [record['type'] for record in records] == ['json'] * 3 + ['msgpack'] * 3
+    assert all(record['path'] == service_url and record['seconds'] >= 0 for record in records)
+    assert records[1]['headers'] == {'x-krpc-result': 'columnar'}
+    assert json.loads(records[0]['body'])['params'] == {'a': 1, 'b': 2}
+    assert [record['method'] for record in load_capture(capture_path)] == ['add', 'echo', 'add'] * 2
+
+
+@pytest.mark.asyncio
+async def test_capture_sampling(capture_path: str):
+    await record_traffic(capture_path, sample_rate=0)
+    assert list(read_capture(capture_path)) == []
+
+    await record_traffic(capture_path, max_bytes=300)
+    records = list(read_capture(capture_path))
+    assert 0 < len(records) < 6
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('speed', [0, 1000])
+async def test_replay(capture_path: str, speed: float):
+    await record_traffic(capture_path)
+    client = RpcClient(url=test_url, transport=ASGITransport(app=app))
+    report = await replay(load_capture(capture_path), client, speed=speed)
+    assert set(report) == {'add', 'echo'}
+    assert report['add']['count'] == 4
+    assert report['add']['errors'] == 2
+    assert report['echo']['errors'] == 0
+    assert 0 < report['echo']['replayed_p50'] <= report['echo']['roundtrip_p50']
+    assert report['echo']['p50_change'] is not None
+
+
+def test_replay_cli(capture_path: str, tmp_path: Any, capsys: Any):
+    asyncio.run(record_traffic(capture_path))
+    output = str(tmp_path / 'report.json')
+    assert main(['replay', capture_path, '--app', 'tests.test_capture:app', '--speed', '0', '--json', output]) == 0
+    assert 'echo' in capsys.readouterr().out
+    with open(output) as f:
+        assert json.load(f)['add']['count'] == 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('target', [app, api_v1.asgi_app()], ids=['fastapi', 'asgi'])
+async def test_server_time_header(target: Any):
+    client = RpcClient(url=test_url, transport=ASGITransport(app=target))
+    body = b'{"id": 1, "method": "add", "params": {"a": 1, "b": 2}}'
+    response = await client.client_async.post(test_url, content=body, headers={TIMING_HEADER: '1'})
+    assert float(response.headers[SERVER_TIME_HEADER]) > 0
+    response = await client.client_async.post(test_url, content=body)
+    assert SERVER_TIME_HEADER not in response.headers
+
+
+async def untimed_app(scope: dict, receive: Any, send: Any) -> None:
+    """不返回处理耗时的回放目标。"""
+    await receive()
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'{"id": 1, "result": 3, "error": null}'})
+
+
+@pytest.mark.asyncio
+async def test_replay_without_server_time(capture_path: str):
+    await record_traffic(capture_path)
+    client = RpcClient(url=test_url, transport=ASGITransport(app=untimed_app))
+    report = await replay(load_capture(capture_path), client, speed=0)
+    assert report['add']['replayed_p50'] is None
+    assert report['add']['p50_change'] is None
+    assert report['add']['roundtrip_p50'] > 0
+
+
+def test_recorder_writes_in_background(capture_path: str):
+    recorder = TrafficRecorder(capture_path)
+    for i in range(100):
+        recorder.record(service_url, 'json', {}, b'{}', float(i), 0.001)
+    recorder.close()
+    assert recorder.records == 100
+    assert not recorder.sample()
+    recorder.record(service_url, 'json', {}, b'{}', 0.0, 0.001)
+    assert [record['time'] for record in read_capture(capture_path)] == [float(i) for i in range(100)]
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([], 50) == 0
@@ -0,0 +1,96 @@
+import json
+from typing import Any
+
+import msgpack
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport
+
+from krpc import Entrypoint, JsonMessage, RpcClient, LazyResponse, MsgpackMessage
+from krpc.message import LazyMsgpackMap
+
+service_url = '/api/v1/rpc'
+test_url = 'http://test' + service_url
+
+report = {
+    'title': 'daily',
+    'rows': [{'id': i, 'name': f'row-{i}'} for i in range(3)],
+    'summary': {'total': 3, 'tags': {'a': 1}},
+}
+
+
+@pytest.fixture
+def app() -> FastAPI:
+    app = FastAPI()
+    api_v1 = Entrypoint(service_url)
+
+    @api_v1.method
+    async def get_report() -> dict:
+        return report
+
+    app.include_router(api_v1)
+    return app
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('rpc_media_type', ['json', 'msgpack'])
+async def test_lazy_response(app: Any, rpc_media_type: str):
+    client = RpcClient(url=test_url, rpc_media_type=rpc_media_type, transport=ASGITransport(app=app))
+    data = await client.call_async('get_report', lazy=True)
+    assert isinstance(data, LazyResponse)
+    assert data['error'] is None
+    assert data['result']['summary']['tags']['a'] == 1
+    assert data['result'] == report
+    assert dict(data)['id'] == data['id']
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('rpc_media_type', ['json', 'msgpack'])
+async def test_raw_result(app: Any, rpc_media_type: str):
+    client = RpcClient(url=test_url, rpc_media_type=rpc_media_type, transport=ASGITransport(app=app))
+    data = await client.call_async('get_report', raw=True)
+    assert isinstance(data['result'], bytes)
+    assert client.messages[rpc_media_type].decode(data['result']) == report
+
+
+def test_msgpack_split_response_does_not_decode_result():
+    message = MsgpackMessage()
+    result = {'rows': [1, 2, 3]}
+    content = msgpack.packb({'id': '1', 'result': result, 'error': None})
+    envelope, raw_result = message.split_response(content)
+    assert envelope == {'id': '1', 'error': None}
+    assert raw_result == msgpack.packb(result)
+
+    lazy = message.decode_lazy(raw_result)
+    assert isinstance(lazy, LazyMsgpackMap)
+    assert lazy._cache == {}
+    assert lazy['rows'] == [1, 2, 3]
+    assert list(lazy._cache) == ['rows']
+
+
+@pytest.mark.parametrize('result', [
+    {'text': 'a"]}{[\\', 'error': [{'result': '}'}], 'tail': '\\"'},
+    [1, [2, {}], ']', None],
+    's]"\\',
+    None,
+])
+def test_json_split_response_slices_result(result: Any):
+    message = JsonMessage()
+    error = {'code': -1, 'message': 'x', 'data': {'error': '"result": 1'}}
+    content = message.encode_response(response_id='"result"', result=result, error=error, etag='error')
+    envelope, raw_result = message.split_response(content)
+    assert envelope == {'id': '"result"', 'error': error, 'etag': 'error'}
+    assert raw_result == json.dumps(result).encode()
+    assert message.decode(raw_result) == result
+
+    # 共享内存段的视图和带缩进的响应同样直接切片
+    content = memoryview(json.dumps({'id': 1, 'result': result, 'error': None}, indent=2).encode())
+    envelope, raw_result = message.split_response(content)
+    assert envelope == {'id': 1, 'error': None}
+    assert isinstance(raw_result, memoryview)
+    assert message.decode(raw_result) == result
+
+    # 不是 krpc 的键顺序时完整解码
+    envelope, raw_result = message.split_response(json.dumps({'error': None, 'result': result}).encode())
+    assert envelope == {'error': None}
+    assert message.decode(raw_result) == result
@@ -0,0 +1,109 @@
+from datetime import date
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport
+from pydantic import BaseModel, Field, computed_field
+
+from krpc import ColumnarRows, Entrypoint, JsonMessage, RpcClient
+from krpc.columnar import to_columnar
+
+service_url = '/api/v1/rpc'
+test_url = 'http://test' + service_url
+
+
+class Row(BaseModel):
+    id: int
+    name: str
+    day: date = Field(date(2024, 1, 1), alias='date')
+
+
+class Account(BaseModel):
+    name: str
+    password: str = Field(exclude=True)
+
+    @computed_field
+    @property
+    def upper(self) -> str:
+        return self.name.upper()
+
+
+rows = [{'id': i, 'name': f'row-{i}', 'score': i / 2} for i in range(5)]
+
+
+@pytest.fixture
+def app() -> FastAPI:
+    app = FastAPI()
+    api_v1 = Entrypoint(service_url)
+
+    @api_v1.method
+    async def report() -> list:
+        return rows
+
+    @api_v1.method(columnar=True)
+    async def models() -> list:
+        return [Row(id=i, name=f'row-{i}') for i in range(3)]
+
+    app.include_router(api_v1)
+    return app
+
+
+def test_to_columnar():
+    result = to_columnar(rows)
+    assert result['__columnar__']['fields'] == ['id', 'name', 'score']
+    assert result['__columnar__']['columns'][0] == [0, 1, 2, 3, 4]
+    # 非同构数据保持原样
+    assert to_columnar([{'a': 1}, {'b': 2}]) is None
+    assert to_columnar([1, 2]) is None
+    assert to_columnar([]) is None
+
+
+def test_to_columnar_uses_model_serializer():
+    accounts = [Account(name='a', password='secret'), Account(name='b', password='secret')]
+    result = to_columnar(accounts)['__columnar__']
+    assert result == {'fields': ['name', 'upper'], 'columns': [['a', 'b'], ['A', 'B']]}
+    assert ColumnarRows.from_result(to_columnar(accounts)) == [{'name': 'a', 'upper': 'A'}, {'name': 'b', 'upper': 'B'}]
+    assert to_columnar([Row(id=1, name='x')])['__columnar__']['columns'][2] == ['2024-01-01']
+
+
+def test_columnar_is_smaller():
+    message = JsonMessage()
+    many = [{'id': i, 'name': f'row-{i}', 'score': i / 2} for i in range(1000)]
+    assert len(message.encode(to_columnar(many))) * 2 < len(message.encode(many))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('rpc_media_type', ['json', 'msgpack'])
+async def test_columnar_negotiated(app: Any, rpc_media_type: str):
+    client = RpcClient(url=test_url, rpc_media_type=rpc_media_type, transport=ASGITransport(app=app))
+    data = await client.call_async('report', columnar=True)
+    result = data['result']
+    assert isinstance(result, ColumnarRows)
+    assert result == rows
+    assert result[-1] == rows[-1]
+    assert result.columns['name'] == [row['name'] for row in rows]
+
+    client = RpcClient(url=test_url, rpc_media_type=rpc_media_type, transport=ASGITransport(app=app))
+    data = await client.call_async('report')
+    assert data['result'] == rows
+    assert isinstance(data['result'], list)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('lazy', [False, True])
+async def test_columnar_method(app: Any, lazy: bool):
+    client = RpcClient(url=test_url, rpc_media_type='msgpack', transport=ASGITransport(app=app))
+    data = await client.call_async('models', lazy=lazy)
+    result = data['result']
+    assert isinstance(result, ColumnarRows)
+    assert result.fields == ['id', 'name', 'date']
+    assert result[1] == {'id': 1, 'name': 'row-1', 'date': '2024-01-01'}
+
+
+def test_to_numpy():
+    numpy = pytest.importorskip('numpy')
+    data = to_columnar(rows)
+    columns = ColumnarRows.from_result(data).to_numpy()
+    assert columns['id'].dtype.kind == 'i'
+    assert numpy.allclose(columns['score'], [row['score'] for row in rows])
@@ -0,0 +1,82 @@
+from typing import Any
+
+import pytest
+from fastapi import Depends, FastAPI, Request
+from httpx import ASGITransport
+
+from krpc import Entrypoint, RpcClient
+
+service_url = '/api/v1/jsonrpc'
+test_url = 'http://test' + service_url
+
+
+@pytest.fixture
+def events() -> list:
+    return []
+
+
+@pytest.fixture
+def entrypoint(events: list) -> Entrypoint:
+    api_v1 = Entrypoint(service_url)
+
+    @api_v1.resource
+    async def pool():
+        events.append('pool:open')
+        yield {'connections': 4}
+        events.append('pool:close')
+
+    async def session(request: Request, pool=Depends(pool)):
+        events.append('session:open')
+        yield {'pool': pool, 'agent': request.headers.get('X-Agent')}
+        events.append('session:close')
+
+    async def repository(session=Depends(session)):
+        return session
+
+    @api_v1.method
+    async def info(name: str, session=Depends(session), repository=Depends(repository)) -> dict:
+        assert repository is session
+        return {'name': name, 'connections': session['pool']['connections'], 'agent': session['agent']}
+
+    return api_v1
+
+
+@pytest.fixture
+def app(entrypoint: Entrypoint) -> FastAPI:
+    app = FastAPI()
+    app.include_router(entrypoint)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_request_scoped_dependency(app: Any, events: list):
+    client = RpcClient(url=test_url, transport=ASGITransport(app=app))
+    data = await client.call_async('info', {'name': 'krpc'}, headers={'X-Agent': 'test'})
+    assert data['result'] == {'name': 'krpc', 'connections': 4, 'agent': 'test'}
+    # 资源在首次使用时创建，请求依赖在请求结束时清理且同一请求内只创建一次
+    assert events == ['pool:open', 'session:open', 'session:close']
+
+
+@pytest.mark.asyncio
+async def test_resources_follow_lifespan(app: Any, events: list):
+    async with app.router.lifespan_context(app):
+        assert events == ['pool:open']
+        for _ in range(2):
+            client = RpcClient(url=test_url, transport=ASGITransport(app=app))
+            data = await client.call_async('info', {'name': 'krpc'})
+            assert data['result']['connections'] == 4
+    assert events.count('pool:open') == 1
+    assert events[-1] == 'pool:close'
+
+
+@pytest.mark.asyncio
+async def test_resource_cannot_depend_on_request_dependency(entrypoint: Entrypoint):
+    async def session():
+        return None
+
+    @entrypoint.resource
+    async def cache(session=Depends(session)):
+        return None
+
+    with pytest.raises(TypeError):
+        await entrypoint.resources.startup()
@@ -0,0 +1,156 @@
+from typing import Any
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport
+
+from krpc import Entrypoint, JsonMessage, MsgpackMessage, RpcClient
+
+service_url = '/api/v1/rpc'
+test_url = 'http://test' + service_url
+
+
+@pytest.fixture
+def state() -> dict:
+    return {'version': 1, 'rows': [{'id': i, 'name': f'row-{i}'} for i in range(100)]}
+
+
+@pytest.fixture
+def app(state: dict) -> FastAPI:
+    app = FastAPI()
+    api_v1 = Entrypoint(service_url)
+
+    @api_v1.method(etag=True)
+    async def dashboard(limit: int = 100) -> list:
+        return state['rows'][:limit]
+
+    @api_v1.method(etag=lambda result: result['version'])
+    async def versioned() -> dict:
+        return {'version': state['version'], 'rows': state['rows']}
+
+    @api_v1.method
+    async def plain() -> int:
+        return 1
+
+    app.include_router(api_v1)
+    return app
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """记录每次响应的字节数。"""
+
+    def __init__(self, app: Any):
+        self.transport = ASGITransport(app=app)
+        self.sizes: list[int] = []
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.transport.handle_async_request(request)
+        content = await response.aread()
+        self.sizes.append(len(content))
+        return httpx.Response(response.status_code, headers=response.headers, content=content)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('rpc_media_type', ['json', 'msgpack'])
+async def test_not_modified(app: Any, state: dict, rpc_media_type: str):
+    transport = RecordingTransport(app)
+    client = RpcClient(url=test_url, rpc_media_type=rpc_media_type, transport=transport)
+
+    first = await client.call_async('dashboard')
+    assert 'not_modified' not in first
+    second = await client.call_async('dashboard')
+    assert second['not_modified'] is True
+    assert second['etag'] == first['etag']
+    assert second['result'] == state['rows']
+    assert transport.sizes[1] * 4 < transport.sizes[0]
+
+    # 参数不同的调用各自缓存
+    other = await client.call_async('dashboard', {'limit': 2})
+    assert 'not_modified' not in other
+    assert other['result'] == state['rows'][:2]
+
+    # 结果变化后返回新的结果和 ETag
+    state['rows'] = state['rows'][1:]
+    third = await client.call_async('dashboard')
+    assert 'not_modified' not in third
+    assert third['etag'] != first['etag']
+    assert third['result'] == state['rows']
+
+
+@pytest.mark.asyncio
+async def test_declared_version(app: Any, state: dict):
+    client = RpcClient(url=test_url, transport=ASGITransport(app=app))
+    first = await client.call_async('versioned')
+    assert first['etag'] == '1'
+    assert (await client.call_async('versioned'))['not_modified'] is True
+    state['version'] = 2
+    data = await client.call_async('versioned')
+    assert data['etag'] == '2'
+    assert 'not_modified' not in data
+
+
+@pytest.mark.asyncio
+async def test_cache_disabled_and_plain_methods(app: Any):
+    client = RpcClient(url=test_url, transport=ASGITransport(app=app), etag_cache_size=0)
+    await client.call_async('dashboard')
+    assert 'not_modified' not in await client.call_async('dashboard')
+
+    data = await client.call_async('plain')
+    assert data == {'id': data['id'], 'result': 1, 'error': None}
+
+
+@pytest.mark.asyncio
+async def test_etag_error():
+    api_v1 = Entrypoint(service_url)
+
+    @api_v1.method(etag=lambda result: result['version'])
+    async def unversioned() -> dict:
+        return {'rows': []}
+
+    app = FastAPI()
+    app.include_router(api_v1)
+    for transport in (ASGITransport(app=app), ASGITransport(app=api_v1.asgi_app())):
+        client = RpcClient(url=test_url, transport=transport)
+        data = await client.call_async('unversioned')
+        assert data['result'] is None
+        assert data['error']['code'] == -32603
+
+
+@pytest.mark.asyncio
+async def test_declared_version_with_columnar():
+    rows = [{'id': 1, 'v': 1}, {'id': 2, 'v': 2}]
+    api_v1 = Entrypoint(service_url)
+
+    @api_v1.method(etag=lambda result: max(row['v'] for row in result))
+    async def report() -> list:
+        return rows
+
+    @api_v1.method(columnar=True, etag=lambda result: len(result))
+    async def columnar_report() -> list:
+        return rows
+
+    app = FastAPI()
+    app.include_router(api_v1)
+    client = RpcClient(url=test_url, transport=ASGITransport(app=app))
+    for method, columnar, etag in (('report', True, '2'), ('columnar_report', False, '2')):
+        data = await client.call_async(method, columnar=columnar)
+        assert data['error'] is None
+        assert data['etag'] == etag
+        assert list(data['result']) == rows
+        assert (await client.call_async(method, columnar=columnar))['not_modified'] is True
+
+
+def test_encode_not_modified():
+    content = JsonMessage().encode_response(response_id=1, etag='abc', not_modified=True)
+    assert JsonMessage().decode(content) == {
+        'id': 1, 'result': None, 'error': None, 'etag': 'abc', 'not_modified': True,
+    }
+
+
+@pytest.mark.parametrize('message', [JsonMessage(), MsgpackMessage()])
+def test_join_response(message: Any):
+    result = {'rows': [1, 'é'], 'empty': None}
+    for response_id in (1, 'a"b', None):
+        expected = message.encode_response(response_id=response_id, result=result, etag='abc')
+        assert message.join_response(response_id, message.encode(result), 'abc') == expected
@@ -0,0 +1,25 @@
+import subprocess
+import sys
+
+# 仅使用客户端和编码器时不应加载的模块
+SERVER_MODULES = ('fastapi', 'starlette', 'msgpack', 'krpc.core', 'krpc.depends', 'krpc.method')
+
+
+def loaded_modules(code: str) -> list:
+    script = f"import sys\n{code}\nprint(' '.join(m for m in {SERVER_MODULES!r} if m in sys.modules))"
+    output = subprocess.run([sys.executable, '-c', script], check=True, capture_output=True, text=True).stdout
+    return output.split()
+
+
+def test_client_import_is_lightweight():
+    assert loaded_modules("from krpc import RpcClient, DictConfig, JsonMessage, message_management") == []
+
+
+def test_json_codec_does_not_load_msgpack():
+    code = "from krpc import JsonMessage\nJsonMessage().decode(JsonMessage().encode({'id': 1}))"
+    assert loaded_modules(code) == []
+
+
+def test_server_names_load_on_demand():
+    assert set(loaded_modules("from krpc import Entrypoint")) >= {'fastapi', 'krpc.core'}
+    assert 'msgpack' in loaded_modules("from krpc import MsgpackMessage\nMsgpackMessage().encode({})")
@@ -0,0 +1,94 @@
+import json
+import random
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport
+
+from krpc import Entrypoint, RpcClient
+from krpc.load import TRANSPORT_ERROR, Histogram, error_name, load, load_mix, main, run_load
+
+service_url = '/api/v1/rpc'
+test_url = 'http://test' + service_url
+
+app = FastAPI()
+api_v1 = Entrypoint(service_url)
+
+
+@api_v1.method
+async def add(a: int, b: int) -> int:
+    return a + b
+
+
+app.include_router(api_v1)
+
+mix = [
+    {'method': 'add', 'params': {'a': 1, 'b': 2}, 'weight': 8},
+    {'method': 'add', 'params': {'a': 'x'}, 'weight': 1},
+    {'method': 'missing', 'params': {}, 'weight': 1},
+]
+
+
+@pytest.fixture
+def mix_path(tmp_path: Any) -> str:
+    path = tmp_path / 'mix.json'
+    path.write_text(json.dumps(mix))
+    return str(path)
+
+
+def test_histogram():
+    histogram = Histogram()
+    values = [random.randint(1, 10_000_000) for _ in range(10000)]
+    for value in values:
+        histogram.record(value)
+    values.sort()
+    for q in (50, 90, 99, 99.9):
+        exact = values[int(q / 100 * len(values)) - 1]
+        assert abs(histogram.percentile(q) - exact) / exact < 0.01
+    assert histogram.percentile(100) == values[-1]
+
+    other = Histogram.from_dict(json.loads(json.dumps(histogram.to_dict())))
+    other.merge(histogram)
+    assert other.count == 20000
+    assert other.percentile(50) == histogram.percentile(50)
+    assert (other.min, other.max) == (values[0], values[-1])
+
+
+def test_error_name():
+    assert error_name({'code': -32602, 'message': 'Invalid params'}) == 'INVALID_PARAMS'
+    assert error_name({'code': 1}) == 'CODE_1'
+    assert error_name('All connection attempts failed') == TRANSPORT_ERROR
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('rpc_media_type', ['json', 'msgpack'])
+async def test_run_load(mix_path: str, rpc_media_type: str):
+    client = RpcClient(url=test_url, rpc_media_type=rpc_media_type, transport=ASGITransport(app=app))
+    result = await run_load(client, load_mix(mix_path), rate=500, duration=0.4, seed=1)
+    assert result['sent'] == 200
+    errors = result['errors']
+    assert set(errors) == {'INVALID_PARAMS', 'METHOD_NOT_FOUND'}
+    assert result['ok'] + sum(errors.values()) == 200
+    assert Histogram.from_dict(result['latency']).count == 200
+
+
+def test_load_processes():
+    result = load(mix, rate=200, duration=0.5, app='tests.test_load:app', processes=2, seed=1)
+    assert result['sent'] == 100
+    assert result['ok'] + sum(result['errors'].values()) == 100
+    assert result['throughput'] > 0
+
+
+def test_main(mix_path: str, tmp_path: Any, capsys: Any):
+    output = str(tmp_path / 'result.json')
+    assert main([mix_path, '--app', 'tests.test_load:app', '-r', '200', '-d', '0.25', '--json', output]) == 0
+    out = capsys.readouterr().out
+    assert 'METHOD_NOT_FOUND' in out and '99.9%' in out
+    with open(output) as f:
+        assert json.load(f)['sent'] == 50
+
+
+def test_load_requires_one_target():
+    with pytest.raises(ValueError):
+        load(mix, rate=1, duration=1)
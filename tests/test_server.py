@@ -0,0 +1,138 @@
+import socket
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+
+from krpc import Entrypoint, RpcClient
+
+pytest.importorskip("uvicorn")
+from krpc.server import Supervisor, find_entrypoints, merge_stats  # noqa: E402
+
+service_url = '/api/v1/jsonrpc'
+
+app = FastAPI()
+api_v1 = Entrypoint(service_url)
+
+
+@api_v1.method
+async def add(a: int, b: int) -> int:
+    return a + b
+
+
+app.include_router(api_v1)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(predicate, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            pytest.fail("timed out")
+        time.sleep(0.05)
+
+
+def test_find_entrypoints():
+    mounted = FastAPI()
+    other = Entrypoint('/other')
+    mounted.mount('/raw', other.asgi_app())
+    mounted.include_router(api_v1)
+    assert find_entrypoints(mounted) == [other, api_v1]
+
+
+def test_merge_stats():
+    worker = {service_url: {'add': {'calls': 2, 'errors': 1, 'seconds': 0.5}}}
+    assert merge_stats([worker, worker]) == {service_url: {'add': {'calls': 4, 'errors': 2, 'seconds': 1.0}}}
+
+
+def test_supervisor_workers_and_rolling_restart():
+    port = free_port()
+    supervisor = Supervisor(
+        'tests.test_server:app', port=port, workers=2, stats_interval=0.1, log_level='warning',
+    )
+    thread = threading.Thread(target=supervisor.run, kwargs={'install_signals': False}, daemon=True)
+    thread.start()
+    try:
+        wait_for(lambda: len(supervisor.workers) == 2)
+        client = RpcClient(url=f'http://127.0.0.1:{port}{service_url}')
+        for _ in range(10):
+            assert client.call('add', {'a': 1, 'b': 2})['result'] == 3
+        wait_for(lambda: supervisor.collect_stats().get(service_url, {}).get('add', {}).get('calls') == 10)
+
+        old_pids = {process.pid for process in supervisor.workers.values()}
+        supervisor.request_restart()
+        wait_for(lambda: not old_pids & {process.pid for process in supervisor.workers.values()})
+        client = RpcClient(url=f'http://127.0.0.1:{port}{service_url}')
+        assert client.call('add', {'a': 2, 'b': 2})['result'] == 4
+    finally:
+        supervisor.request_stop()
+        thread.join(timeout=30)
+    assert not supervisor.workers
+
+
+class FakeProcess:
+    def __init__(self, pid: int, alive: bool = True):
+        self.pid = pid
+        self.alive = alive
+        self.exitcode = None if alive else 1
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def terminate(self) -> None:
+        self.alive = False
+
+    def join(self, timeout: float = None) -> None:
+        pass
+
+
+def failing_spawn(index: int):
+    raise RuntimeError(f"krpc worker {index} failed to start")
+
+
+def test_spawn_fails_fast_when_worker_exits():
+    supervisor = Supervisor('tests.missing_module:app', workers=1, ready_timeout=60)
+    started = time.monotonic()
+    with pytest.raises(RuntimeError):
+        supervisor.spawn(0)
+    assert time.monotonic() - started < 30
+
+
+def test_rolling_restart_keeps_workers_when_spawn_fails():
+    supervisor = Supervisor('tests.test_server:app', workers=2)
+    old = {0: FakeProcess(1), 1: FakeProcess(2)}
+    supervisor.workers = dict(old)
+    supervisor.spawn = failing_spawn
+    assert supervisor.rolling_restart() is False
+    assert supervisor.workers == old
+    assert all(process.is_alive() for process in old.values())
+
+
+def test_respawn_backs_off_after_failure():
+    supervisor = Supervisor('tests.test_server:app', workers=1)
+    supervisor.workers = {0: FakeProcess(1, alive=False)}
+    attempts = []
+
+    def spawn(index: int):
+        attempts.append(index)
+        if len(attempts) == 1:
+            failing_spawn(index)
+        return FakeProcess(2)
+
+    supervisor.spawn = spawn
+    supervisor.respawn(0)
+    supervisor.respawn(0)
+    assert attempts == [0]
+    assert supervisor.workers[0].pid == 1
+
+    supervisor._respawn_at[0] = 0.0
+    supervisor.respawn(0)
+    assert attempts == [0, 0]
+    assert supervisor.workers[0].pid == 2
+    assert supervisor._backoff == {}
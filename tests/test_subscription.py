@@ -0,0 +1,219 @@
+import asyncio
+from typing import Any
+
+import pytest
+from fastapi import FastAPI, Request
+from httpx import ASGITransport
+
+from krpc import Entrypoint, JsonMessage, RpcClient
+from krpc.message import FrameDecoder, encode_frame
+from krpc.subscription import BLOCK, DISCONNECT, DROP_NEWEST, DROP_OLDEST, Event, Subscriber, stream_events
+
+service_url = '/api/v1/rpc'
+test_url = 'http://test' + service_url
+
+
+@pytest.fixture
+def api_v1() -> Entrypoint:
+    api_v1 = Entrypoint(service_url)
+
+    @api_v1.subscribe
+    async def count(n: int):
+        for i in range(n):
+            yield {'i': i}
+
+    @api_v1.subscribe
+    async def broken():
+        yield 1
+        raise RuntimeError('boom')
+
+    return api_v1
+
+
+@pytest.fixture
+def app(api_v1: Entrypoint) -> FastAPI:
+    app = FastAPI()
+    app.include_router(api_v1)
+    return app
+
+
+async def collect(client: RpcClient, method: str, params: dict = None) -> list:
+    return [event async for event in client.subscribe_async(method, params)]
+
+
+def test_frame_decoder():
+    frames = encode_frame(b'abc') + encode_frame(b'') + encode_frame(b'de')
+    decoder = FrameDecoder()
+    assert decoder.feed(frames[:5]) == []
+    assert decoder.feed(frames[5:]) == [b'abc', b'', b'de']
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('rpc_media_type', ['json', 'msgpack'])
+async def test_subscribe(app: Any, rpc_media_type: str):
+    client = RpcClient(url=test_url, rpc_media_type=rpc_media_type, transport=ASGITransport(app=app))
+    events = await collect(client, 'count', {'n': 3})
+    assert events == [{'result': {'i': i}, 'error': None} for i in range(3)]
+
+
+@pytest.mark.asyncio
+async def test_subscribe_asgi_app(api_v1: Entrypoint):
+    client = RpcClient(url=test_url, rpc_media_type='msgpack', transport=ASGITransport(app=api_v1.asgi_app()))
+    events = await collect(client, 'count', {'n': 2})
+    assert [event['result'] for event in events] == [{'i': 0}, {'i': 1}]
+
+
+@pytest.mark.asyncio
+async def test_subscribe_errors(app: Any):
+    client = RpcClient(url=test_url, transport=ASGITransport(app=app))
+
+    events = await collect(client, 'missing')
+    assert [event['error']['code'] for event in events] == [-32601]
+
+    events = await collect(client, 'count', {'n': 'x'})
+    assert [event['error']['code'] for event in events] == [-32602]
+
+    events = await collect(client, 'broken')
+    assert events[0] == {'result': 1, 'error': None}
+    assert events[1]['error']['code'] == -32603
+
+
+@pytest.mark.asyncio
+async def test_fan_out_shares_producer():
+    api_v1 = Entrypoint(service_url)
+    state = {'started': 0, 'closed': 0}
+    gate = asyncio.Event()
+
+    @api_v1.subscribe
+    async def ticker(symbol: str):
+        state['started'] += 1
+        try:
+            await gate.wait()
+            for price in range(3):
+                yield {'symbol': symbol, 'price': price}
+        finally:
+            state['closed'] += 1
+
+    message = JsonMessage()
+    body = message.encode({'id': 1, 'method': 'ticker', 'params': {'symbol': 'BTC'}})
+
+    async def consume() -> list:
+        decoder = FrameDecoder()
+        frames = []
+        async for frame in stream_events(message, body, api_v1.rpc_subscriptions, api_v1.broadcaster):
+            frames.extend(decoder.feed(frame))
+        return [message.decode(frame)['result']['price'] for frame in frames]
+
+    consumers = [asyncio.create_task(consume()) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    assert len(api_v1.broadcaster.topics) == 1
+    gate.set()
+    assert await asyncio.gather(*consumers) == [[0, 1, 2]] * 3
+    assert state == {'started': 1, 'closed': 1}
+    assert api_v1.broadcaster.topics == {}
+
+
+@pytest.mark.asyncio
+async def test_last_subscriber_stops_producer():
+    api_v1 = Entrypoint(service_url)
+    closed = asyncio.Event()
+
+    @api_v1.subscribe
+    async def forever():
+        try:
+            while True:
+                yield 1
+                await asyncio.sleep(0)
+        finally:
+            closed.set()
+
+    message = JsonMessage()
+    body = message.encode({'id': 1, 'method': 'forever', 'params': {}})
+    events = stream_events(message, body, api_v1.rpc_subscriptions, api_v1.broadcaster)
+    await events.__anext__()
+    await events.aclose()
+    await asyncio.wait_for(closed.wait(), 1)
+    assert api_v1.broadcaster.topics == {}
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_policies():
+    oldest = Subscriber(queue_size=2, policy=DROP_OLDEST)
+    newest = Subscriber(queue_size=2, policy=DROP_NEWEST)
+    disconnect = Subscriber(queue_size=2, policy=DISCONNECT)
+    for i in range(4):
+        for subscriber in (oldest, newest, disconnect):
+            await subscriber.put(Event(result=i))
+    for subscriber in (oldest, newest):
+        subscriber.finish()
+
+    async def results(subscriber: Subscriber) -> list:
+        return [event.result async for event in subscriber]
+
+    assert await results(oldest) == [2, 3]
+    assert await results(newest) == [0, 1]
+    assert await results(disconnect) == []
+    assert oldest.dropped == newest.dropped == 2
+
+
+def test_unknown_policy():
+    api_v1 = Entrypoint(service_url)
+    with pytest.raises(ValueError):
+        @api_v1.subscribe(policy='nope')
+        async def events():
+            yield 1
+
+
+@pytest.mark.asyncio
+async def test_block_policy_waits_for_consumer():
+    subscriber = Subscriber(queue_size=1, policy=BLOCK)
+    await subscriber.put(Event(result=0))
+    pending = asyncio.create_task(subscriber.put(Event(result=1)))
+    await asyncio.sleep(0.01)
+    assert not pending.done()
+
+    events = subscriber.__aiter__()
+    assert (await events.__anext__()).result == 0
+    await asyncio.wait_for(pending, 1)
+    assert (await events.__anext__()).result == 1
+
+
+@pytest.mark.asyncio
+async def test_request_dependent_subscriptions_are_not_shared():
+    api_v1 = Entrypoint(service_url)
+    gate = asyncio.Event()
+
+    @api_v1.subscribe
+    async def inbox(request: Request):
+        await gate.wait()
+        yield request.headers['X-User']
+
+    app = FastAPI()
+    app.include_router(api_v1)
+    client = RpcClient(url=test_url, transport=ASGITransport(app=app))
+
+    async def receive(user: str) -> list:
+        events = client.subscribe_async('inbox', headers={'X-User': user})
+        return [event['result'] async for event in events]
+
+    consumers = [asyncio.create_task(receive(user)) for user in ('alice', 'bob')]
+    await asyncio.sleep(0.05)
+    assert api_v1.broadcaster.topics == {}
+    gate.set()
+    assert await asyncio.gather(*consumers) == [['alice'], ['bob']]
+    assert not api_v1.rpc_subscriptions['inbox'].shared
+
+
+def test_shared_option():
+    api_v1 = Entrypoint(service_url)
+
+    @api_v1.subscribe(shared=False)
+    async def plain():
+        yield 1
+
+    @api_v1.subscribe(shared=True)
+    async def forced(request: Request):
+        yield 1
+
+    assert not api_v1.rpc_subscriptions['plain'].shared
+    assert api_v1.rpc_subscriptions['forced'].shared
@@ -0,0 +1,137 @@
+import asyncio
+import glob
+import os
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+
+from krpc import Entrypoint, RpcClient
+
+uvicorn = pytest.importorskip("uvicorn")
+from krpc.server import unix_server  # noqa: E402
+from krpc.shm import (  # noqa: E402
+    SEGMENT_PREFIX, SHM_EXTENSION, SHM_SEGMENT_HEADER, SharedMemoryMiddleware, default_directory, read_segment,
+    sweep_segments, write_segment,
+)
+
+service_url = '/api/v1/jsonrpc'
+test_url = 'http://localhost' + service_url
+
+
+@pytest.fixture
+def app() -> FastAPI:
+    app = FastAPI()
+    api_v1 = Entrypoint(service_url)
+
+    @api_v1.method
+    async def echo(value: str) -> str:
+        return value
+
+    app.include_router(api_v1)
+    return app
+
+
+@pytest.fixture
+def socket_path(app, tmp_path):
+    path = str(tmp_path / 'krpc.sock')
+    server = unix_server(app, path, log_level='warning', lifespan='off')
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not server.started:
+        if time.monotonic() > deadline:
+            pytest.fail("uvicorn did not start on the unix socket")
+        time.sleep(0.01)
+    yield path
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.mark.parametrize('rpc_media_type', ['json', 'msgpack'])
+def test_unix_socket_call(socket_path, rpc_media_type):
+    client = RpcClient(url=test_url, rpc_media_type=rpc_media_type, uds=socket_path)
+    data = client.call('echo', {'value': 'hello'})
+    assert data['result'] == 'hello'
+
+
+@pytest.mark.asyncio
+async def test_unix_socket_call_async(socket_path):
+    client = RpcClient(url=test_url, uds=socket_path)
+    data = await client.call_async('echo', {'value': 'hello'})
+    assert data['result'] == 'hello'
+
+
+def test_non_socket_file_is_not_replaced(app, tmp_path):
+    path = tmp_path / 'stale.sock'
+    path.write_text('not a socket')
+    with pytest.raises(FileExistsError):
+        unix_server(app, str(path))
+
+
+def segments() -> list:
+    return glob.glob(f'{default_directory()}/{SEGMENT_PREFIX}*')
+
+
+@pytest.mark.parametrize('rpc_media_type', ['json', 'msgpack'])
+def test_large_result_uses_shared_memory(socket_path, rpc_media_type):
+    value = 'x' * 300_000
+    client = RpcClient(url=test_url, rpc_media_type=rpc_media_type, uds=socket_path)
+    assert client.call('echo', {'value': value})['result'] == value
+    assert client.call('echo', {'value': value}, lazy=True)['result'] == value
+
+    message = client._get_message()
+    body = message.encode({'id': 1, 'method': 'echo', 'params': {'value': value}})
+    response = client.client_sync.post(test_url, content=body, headers={'X-Krpc-Type': rpc_media_type})
+    assert response.content == b''
+    assert message.decode(response.extensions[SHM_EXTENSION])['result'] == value
+    small = client.client_sync.post(
+        test_url, content=message.encode({'id': 1, 'method': 'echo', 'params': {'value': 'a'}}),
+        headers={'X-Krpc-Type': rpc_media_type},
+    )
+    assert SHM_EXTENSION not in small.extensions
+    assert segments() == []
+
+
+@pytest.mark.asyncio
+async def test_large_result_uses_shared_memory_async(socket_path):
+    value = 'y' * 300_000
+    client = RpcClient(url=test_url, rpc_media_type='msgpack', uds=socket_path)
+    assert (await client.call_async('echo', {'value': value}))['result'] == value
+    assert segments() == []
+
+
+def test_segment_roundtrip(tmp_path):
+    path = write_segment(b'payload', str(tmp_path))
+    view = read_segment(path, 7)
+    assert bytes(view) == b'payload'
+    assert not list(tmp_path.iterdir())
+    with pytest.raises(ValueError):
+        read_segment(str(tmp_path / 'other'), 1)
+
+
+@pytest.mark.asyncio
+async def test_unread_segment_expires(app, tmp_path):
+    import httpx
+
+    # 不读取段的客户端（例如不支持共享内存的传输），段在 ttl 后由服务端删除
+    middleware = SharedMemoryMiddleware(app, threshold=1024, directory=str(tmp_path), ttl=0.05)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware)) as client:
+        response = await client.post(test_url, json={'id': 1, 'method': 'echo', 'params': {'value': 'z' * 4096}},
+                                     headers={'X-Krpc-Shm': '1'})
+    path = response.headers[SHM_SEGMENT_HEADER]
+    assert os.path.exists(path)
+    await asyncio.sleep(0.2)
+    assert not os.path.exists(path)
+
+
+def test_sweep_segments(tmp_path):
+    stale = write_segment(b'stale', str(tmp_path))
+    fresh = write_segment(b'fresh', str(tmp_path))
+    other = tmp_path / 'other'
+    other.write_bytes(b'')
+    os.utime(stale, (time.time() - 120, time.time() - 120))
+    os.utime(other, (time.time() - 120, time.time() - 120))
+    assert sweep_segments(str(tmp_path), max_age=60) == 1
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(fresh), 'other'])
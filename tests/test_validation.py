@@ -0,0 +1,79 @@
+from typing import Any, Optional, Union
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport
+from pydantic import BaseModel
+
+from krpc import Entrypoint, RpcClient, RpcErrorCode
+from krpc.method import ParamsError, RpcMethod
+
+service_url = '/api/v1/jsonrpc'
+test_url = 'http://test' + service_url
+
+
+class Point(BaseModel):
+    x: int
+    y: int
+
+
+async def shapes(
+        ids: list[int],
+        scale: float,
+        label: Optional[str] = None,
+        key: Union[int, str] = 0,
+        origin: Optional[Point] = None,
+        extra: Any = None,
+) -> dict:
+    return {'ids': ids, 'scale': scale, 'label': label, 'key': key, 'origin': origin}
+
+
+@pytest.fixture
+def app() -> FastAPI:
+    app = FastAPI()
+    api_v1 = Entrypoint(service_url)
+    api_v1.method(shapes)
+    app.include_router(api_v1)
+    return app
+
+
+def test_primitive_fast_path():
+    method = RpcMethod(shapes)
+    kwargs = method.validate({'ids': [1, 2], 'scale': 2})
+    assert kwargs == {'ids': [1, 2], 'scale': 2.0}
+    assert type(kwargs['scale']) is float
+
+
+def test_generics_and_models():
+    method = RpcMethod(shapes)
+    kwargs = method.validate({
+        'ids': ['1', 2], 'scale': '1.5', 'label': None, 'key': 'k', 'origin': {'x': 1, 'y': 2},
+    })
+    assert kwargs['ids'] == [1, 2]
+    assert kwargs['scale'] == 1.5
+    assert kwargs['key'] == 'k'
+    assert kwargs['origin'] == Point(x=1, y=2)
+
+
+def test_errors_name_the_field():
+    method = RpcMethod(shapes)
+    with pytest.raises(ParamsError) as exc_info:
+        method.validate({'ids': [1, 'x'], 'origin': {'x': 1}})
+    fields = [error['field'] for error in exc_info.value.errors]
+    assert fields == ['ids.1', 'scale', 'origin.y']
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('rpc_media_type', ['json', 'msgpack'])
+async def test_invalid_params_response(app: Any, rpc_media_type: str):
+    client = RpcClient(url=test_url, rpc_media_type=rpc_media_type, transport=ASGITransport(app=app))
+    data = await client.call_async('shapes', {'ids': 'not-a-list', 'scale': 1})
+    assert data['error']['code'] == RpcErrorCode.INVALID_PARAMS.value[0]
+    assert data['error']['data'][0]['field'] == 'ids'
+
+
+@pytest.mark.asyncio
+async def test_valid_generic_params(app: Any):
+    client = RpcClient(url=test_url, transport=ASGITransport(app=app))
+    data = await client.call_async('shapes', {'ids': [3], 'scale': 1, 'origin': {'x': 1, 'y': 2}})
+    assert data['result'] == {'ids': [3], 'scale': 1.0, 'label': None, 'key': 0, 'origin': {'x': 1, 'y': 2}}